@@ -19,6 +19,8 @@ from app.db.database import Base
 from app.models.user_model import User
 from app.models.match_history import MatchHistory
 from app.models.match_score import MatchScore
+from app.models.embedding_job import EmbeddingJob
+from app.models.questionnaire_session import QuestionnaireSession
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,28 @@
+"""Add version column to questionnaire_sessions for compare-and-set saves
+
+Revision ID: 3b7e2c91d4a6
+Revises: ffa126f5cb4e
+Create Date: 2026-10-19 18:42:05.731164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e2c91d4a6'
+down_revision: Union[str, Sequence[str], None] = 'ffa126f5cb4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('questionnaire_sessions', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('questionnaire_sessions', 'version')
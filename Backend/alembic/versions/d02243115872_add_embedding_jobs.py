@@ -0,0 +1,44 @@
+"""Add embedding_jobs table for background questionnaire embedding
+
+Revision ID: d02243115872
+Revises: 9f6ba3ff7b0f
+Create Date: 2026-10-19 10:12:41.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd02243115872'
+down_revision: Union[str, Sequence[str], None] = '9f6ba3ff7b0f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('embedding_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_email', sa.String(), nullable=False),
+    sa.Column('chat_history', sa.JSON(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'SUCCEEDED', 'FAILED', name='embeddingjobstatus'), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_embedding_jobs_user_email'), 'embedding_jobs', ['user_email'], unique=False)
+    op.create_index(op.f('ix_embedding_jobs_status'), 'embedding_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_embedding_jobs_status'), table_name='embedding_jobs')
+    op.drop_index(op.f('ix_embedding_jobs_user_email'), table_name='embedding_jobs')
+    op.drop_table('embedding_jobs')
+    sa.Enum(name='embeddingjobstatus').drop(op.get_bind(), checkfirst=True)
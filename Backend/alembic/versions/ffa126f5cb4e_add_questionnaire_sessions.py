@@ -0,0 +1,39 @@
+"""Add questionnaire_sessions table for server-side chat state
+
+Revision ID: ffa126f5cb4e
+Revises: d02243115872
+Create Date: 2026-10-19 11:03:17.220954
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ffa126f5cb4e'
+down_revision: Union[str, Sequence[str], None] = 'd02243115872'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('questionnaire_sessions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_email', sa.String(), nullable=False),
+    sa.Column('chat_history', sa.JSON(), nullable=False),
+    sa.Column('pending_question', sa.String(), nullable=True),
+    sa.Column('completed', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_questionnaire_sessions_user_email'), 'questionnaire_sessions', ['user_email'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_questionnaire_sessions_user_email'), table_name='questionnaire_sessions')
+    op.drop_table('questionnaire_sessions')
@@ -1,21 +1,35 @@
 import os
-from supabase import create_client
 from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, Response, Cookie, Request
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel
 from typing import Optional
+from app.core.auth_tokens import token_verifier, InvalidToken
+from app.core.resilience import DependencyUnavailable
+from app.utils.supabase_client import get_supabase, supabase_guard
+import math
 
 load_dotenv()
 
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
 frontend_url = os.environ.get("FRONTEND_URL", "http://localhost:5173")
 
-supabase = create_client(url, key)
 router = APIRouter(prefix='/auth', tags=["authentication"])
 
 
+def service_unavailable(e: DependencyUnavailable) -> HTTPException:
+    """503 for a dependency whose circuit breaker is open or whose bulkhead is full"""
+    retry_after = max(1, math.ceil(e.retry_after))
+    return HTTPException(
+        status_code=503,
+        detail={
+            "error": "Service temporarily unavailable",
+            "message": f"{e.dependency} is not responding. Please try again in {retry_after} seconds.",
+            "retry_after": retry_after
+        },
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
 class GoogleAuthRequest(BaseModel):
     id_token: str
 
@@ -47,7 +61,7 @@ async def google_login(redirect_to: Optional[str] = None):
         # Determine final redirect destination
         final_redirect = redirect_to or f"{frontend_url}/auth/callback"
         
-        response = supabase.auth.sign_in_with_oauth({
+        response = get_supabase().auth.sign_in_with_oauth({
             "provider": "google",
             "options": {
                 "redirect_to": callback_url,
@@ -84,9 +98,9 @@ async def google_callback(
     
     try:
         # Exchange code for session
-        auth_response = supabase.auth.exchange_code_for_session({
-            "auth_code": code
-        })
+        auth_response = await supabase_guard.run_sync(
+            get_supabase().auth.exchange_code_for_session, {"auth_code": code}
+        )
         
         if not auth_response.session:
             return RedirectResponse(url=f"{frontend_url}/?error=auth_failed")
@@ -130,9 +144,9 @@ async def exchange_session(callback_request: CallbackRequest):
     Used when frontend handles the callback directly.
     """
     try:
-        response = supabase.auth.exchange_code_for_session({
-            "auth_code": callback_request.code
-        })
+        response = await supabase_guard.run_sync(
+            get_supabase().auth.exchange_code_for_session, {"auth_code": callback_request.code}
+        )
         
         if not response.session:
             raise HTTPException(status_code=401, detail="Failed to exchange code for session")
@@ -151,6 +165,8 @@ async def exchange_session(callback_request: CallbackRequest):
                 "created_at": response.user.created_at
             }
         }
+    except DependencyUnavailable as e:
+        raise service_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Exchange error: {str(e)}")
 
@@ -167,7 +183,7 @@ async def refresh_session(
         raise HTTPException(status_code=401, detail="No refresh token found")
     
     try:
-        auth_response = supabase.auth.refresh_session(refresh_token)
+        auth_response = await supabase_guard.run_sync(get_supabase().auth.refresh_session, refresh_token)
 
         if not auth_response.session:
             raise HTTPException(status_code=401, detail="Failed to refresh session")
@@ -194,6 +210,8 @@ async def refresh_session(
         )
 
         return {"message": "Session refreshed successfully"}
+    except DependencyUnavailable as e:
+        raise service_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Refresh error: {str(e)}")
 
@@ -207,22 +225,21 @@ async def get_user(access_token: Optional[str] = Cookie(None)):
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        response = supabase.auth.get_user(access_token)
-
-        if not response.user:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        user = await token_verifier.verify(access_token)
 
         return {
             "user": {
-                "id": response.user.id,
-                "email": response.user.email,
-                "user_metadata": response.user.user_metadata,
-                "app_metadata": response.user.app_metadata,
-                "created_at": response.user.created_at
+                "id": user.id,
+                "email": user.email,
+                "user_metadata": user.user_metadata,
+                "app_metadata": user.app_metadata,
+                "created_at": user.created_at
             }
         }
-    except Exception as e:
+    except InvalidToken as e:
         raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
+    except DependencyUnavailable as e:
+        raise service_unavailable(e)
 
 
 @router.post('/logout')
@@ -235,7 +252,8 @@ async def logout(
     """
     try:
         if access_token:
-            supabase.auth.sign_out(access_token)
+            token_verifier.invalidate(access_token)
+            await supabase_guard.run_sync(get_supabase().auth.sign_out, access_token)
         
         # Clear cookies
         response.delete_cookie(key="access_token", path="/")
@@ -1,8 +1,28 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Cookie
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from app.core.llm_questionnaire import process_and_embed_chat, embed_full_chat, generate_next_question
+from app.core.llm_questionnaire import (
+    process_and_embed_chat,
+    embed_full_chat,
+    generate_next_question,
+    stream_next_question
+)
+from app.core.questionnaire_sessions import (
+    questionnaire_sessions,
+    ChatSession,
+    NoPendingQuestion,
+    SessionConflict
+)
+from app.api.status import verify_auth
+from app.core.prompt_compaction import record_questionnaire_savings
 from app.core.rate_limiter import rate_limiter
+from app.core.admission import llm_admission, Saturated, AdmissionTicket
+import logging
+import json
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["chat"])
 
@@ -30,11 +50,26 @@ class ChatResponse(BaseModel):
 
 
 class NextQuestionRequest(BaseModel):
-    user_email: Optional[str] = Field(None, description="User's email (required for auto-embedding on completion)")
+    user_email: Optional[str] = Field(
+        None,
+        description="User's email (required for auto-embedding on completion). Needs the access_token cookie of the same user"
+    )
     chat_history: List[ChatMessage] = Field(
         default=[],
         description="List of previous Q&A pairs (empty array for first question)"
     )
+    answer: Optional[str] = Field(
+        None,
+        description="Answer to the last question. When set, the history is kept on the server and chat_history is ignored"
+    )
+
+
+class SessionResponse(BaseModel):
+    user_email: str
+    chat_history: List[ChatMessage]
+    pending_question: Optional[str] = Field(None, description="Question waiting for an answer")
+    question_number: int = Field(..., description="Number of the pending (or next) question")
+    is_complete: bool
 
 
 class NextQuestionResponse(BaseModel):
@@ -45,7 +80,7 @@ class NextQuestionResponse(BaseModel):
     category: Optional[str] = Field(None, description="Question category: 'personality' or 'social_energy'")
     message: Optional[str] = Field(None, description="Additional message if complete")
     note: Optional[str] = Field(None, description="Additional notes (e.g., fallback used)")
-    embedding_status: Optional[str] = Field(None, description="Status of auto-embedding (success/error)")
+    embedding_status: Optional[str] = Field(None, description="Status of auto-embedding (queued/success/error)")
     embedding_error: Optional[str] = Field(None, description="Error message if embedding failed")
     user_email: Optional[str] = Field(None, description="User email if embedded successfully")
     answers_processed: Optional[int] = Field(None, description="Number of answers processed in embedding")
@@ -56,11 +91,12 @@ async def embed_chat_history(request: ChatHistoryRequest):
     """
     Process structured chat history (Q&A pairs) and store embeddings in Qdrant.
     """
+    ticket = await admit_llm_request()
     try:
         chat_history_dicts = [msg.dict() for msg in request.chat_history]
         
-        result = process_and_embed_chat(
-            user_id=request.user_email,
+        result = await process_and_embed_chat(
+            user_email=request.user_email,
             chat_history=chat_history_dicts
         )
         
@@ -71,6 +107,8 @@ async def embed_chat_history(request: ChatHistoryRequest):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process chat: {str(e)}")
+    finally:
+        ticket.release()
 
 
 @router.post("/embed-full-text", response_model=ChatResponse)
@@ -78,8 +116,9 @@ async def embed_full_chat_text(request: FullChatRequest):
     """
     Process full chat as single text string and store embeddings in Qdrant.
     """
+    ticket = await admit_llm_request()
     try:
-        result = embed_full_chat(
+        result = await embed_full_chat(
             user_email=request.user_email,
             full_chat_text=request.chat_text
         )
@@ -91,35 +130,136 @@ async def embed_full_chat_text(request: FullChatRequest):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process chat: {str(e)}")
+    finally:
+        ticket.release()
 
 
-@router.post("/next-question", response_model=NextQuestionResponse)
-async def get_next_question(request: NextQuestionRequest):
+async def check_chat_rate_limit(user_email: Optional[str]):
+    # Rate limiting: 15 requests per 10 minutes (600 seconds) per user
+    if not user_email:
+        return
+
+    is_limited, seconds_until_reset = await rate_limiter.check(
+        key=f"chat:{user_email}",
+        max_requests=15,
+        window_seconds=600
+    )
+
+    if is_limited:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "Too many requests",
+                "message": f"Rate limit exceeded. Please try again in {seconds_until_reset} seconds.",
+                "retry_after": seconds_until_reset
+            }
+        )
+
+
+async def admit_llm_request() -> AdmissionTicket:
+    """Take a slot under the global limit on LLM-bound requests, or answer 503 when saturated"""
     try:
-        # Rate limiting: 10 requests per 10 minutes (600 seconds) per user
-        if request.user_email:
-            is_limited, seconds_until_reset = rate_limiter.is_rate_limited(
-                key=f"chat:{request.user_email}",
-                max_requests=15,
-                window_seconds=600
+        return await llm_admission.acquire()
+    except Saturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "Server busy",
+                "message": f"Too many questionnaires in progress. Please try again in {e.retry_after} seconds.",
+                "retry_after": e.retry_after
+            },
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def require_same_user(user, user_email: str):
+    if not user.email or user.email.lower() != user_email.lower():
+        raise HTTPException(status_code=403, detail="Not allowed to access another user's questionnaire")
+
+
+async def authorize_session_request(request: NextQuestionRequest, access_token: Optional[str]):
+    """Requests that touch a server-side session need the access_token cookie of the same user"""
+    if request.user_email:
+        require_same_user(await verify_auth(access_token), request.user_email)
+
+
+def validate_answer_request(request: NextQuestionRequest):
+    if request.answer is not None and not request.user_email:
+        raise HTTPException(status_code=400, detail="user_email is required when sending a single answer")
+
+
+async def start_turn(request: NextQuestionRequest) -> Optional[ChatSession]:
+    """
+    Apply the request to a working copy of the user's server-side session (caller holds
+    the session lock). The stored session only changes once finish_turn saves the copy.
+    """
+    if not request.user_email:
+        return None
+
+    session = (await questionnaire_sessions.get(request.user_email)).copy()
+    if request.answer is not None:
+        try:
+            session.append_answer(request.answer)
+        except NoPendingQuestion:
+            raise HTTPException(
+                status_code=409,
+                detail="No question is waiting for an answer. Reload the session with GET /api/chat/session."
             )
+    else:
+        # Legacy clients send the full history every turn; an empty one restarts the questionnaire
+        session.reset([msg.dict() for msg in request.chat_history])
+    return session
 
-            if is_limited:
-                raise HTTPException(
-                    status_code=429,
-                    detail={
-                        "error": "Too many requests",
-                        "message": f"Rate limit exceeded. Please try again in {seconds_until_reset} seconds.",
-                        "retry_after": seconds_until_reset
-                    }
-                )
 
-        chat_history_dicts = [msg.dict() for msg in request.chat_history]
-        
-        result = generate_next_question(
-            chat_history=chat_history_dicts,
-            user_email=request.user_email
+async def finish_turn(session: Optional[ChatSession], result: dict):
+    if session is None:
+        return
+
+    session.completed = bool(result.get("is_complete"))
+    session.pending_question = None if session.completed else result.get("question")
+    # Taken before saving, so a resent completed questionnaire isn't counted twice
+    token_totals = session.take_token_totals() if session.completed else None
+    try:
+        await questionnaire_sessions.save(session)
+    except SessionConflict:
+        raise HTTPException(
+            status_code=409,
+            detail="The questionnaire was updated by another request. Reload the session with GET /api/chat/session."
         )
+    except Exception as e:
+        # Nothing was stored, so the client can safely resend the same answer
+        logger.warning("Could not save questionnaire session for %s: %s", session.user_email, e)
+        raise HTTPException(status_code=503, detail="Could not save your answer. Please try again.")
+
+    if token_totals and token_totals[0]:
+        record_questionnaire_savings(*token_totals)
+
+
+@router.post("/next-question", response_model=NextQuestionResponse)
+async def get_next_question(request: NextQuestionRequest, access_token: Optional[str] = Cookie(None)):
+    try:
+        validate_answer_request(request)
+        await authorize_session_request(request, access_token)
+        await check_chat_rate_limit(request.user_email)
+        ticket = await admit_llm_request()
+
+        try:
+            if not request.user_email:
+                result = await generate_next_question(
+                    chat_history=[msg.dict() for msg in request.chat_history]
+                )
+                return NextQuestionResponse(**result)
+
+            async with questionnaire_sessions.lock(request.user_email):
+                session = await start_turn(request)
+                result = await generate_next_question(
+                    chat_history=list(session.chat_history),
+                    user_email=request.user_email,
+                    session=session
+                )
+                await finish_turn(session, result)
+        finally:
+            ticket.release()
         
         return NextQuestionResponse(**result)
     
@@ -130,3 +270,88 @@ async def get_next_question(request: NextQuestionRequest):
             status_code=500,
             detail=f"Failed to generate question: {str(e)}"
         )
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/next-question/stream")
+async def stream_question(request: NextQuestionRequest, access_token: Optional[str] = Cookie(None)):
+    """
+    Server-sent events variant of /next-question.
+    Sends `token` events with question text as the LLM generates it, then one
+    `done` event carrying the full NextQuestionResponse. Clients should show the
+    question from `done`, since it may be a fallback that replaces streamed text.
+    """
+    validate_answer_request(request)
+    await authorize_session_request(request, access_token)
+    await check_chat_rate_limit(request.user_email)
+    # Admitted before the response starts, so a saturated server can still answer 503
+    ticket = await admit_llm_request()
+
+    async def turn_events():
+        if not request.user_email:
+            async for event, data in stream_next_question(
+                chat_history=[msg.dict() for msg in request.chat_history]
+            ):
+                yield event, data
+            return
+
+        async with questionnaire_sessions.lock(request.user_email):
+            session = await start_turn(request)
+            async for event, data in stream_next_question(
+                chat_history=list(session.chat_history),
+                user_email=request.user_email,
+                session=session
+            ):
+                if event == "done":
+                    await finish_turn(session, data)
+                yield event, data
+
+    async def event_stream():
+        try:
+            async for event, data in turn_events():
+                if event == "done":
+                    data = NextQuestionResponse(**data).dict()
+                yield sse_event(event, data)
+        except HTTPException as e:
+            # The response has already started, so session errors (409/503) go out as an event
+            yield sse_event("error", {"detail": e.detail, "status_code": e.status_code})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Failed to generate question: {str(e)}"})
+        finally:
+            ticket.release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Stop nginx from buffering the stream
+        },
+        # The stream may never start if the client goes away first; release() is idempotent
+        background=BackgroundTask(ticket.release)
+    )
+
+
+@router.get("/session", response_model=SessionResponse)
+async def get_session(user_email: str, user = Depends(verify_auth)):
+    """
+    Return the user's questionnaire progress so an interrupted chat can be resumed.
+    Requires the access_token cookie of the same user.
+    """
+    require_same_user(user, user_email)
+
+    try:
+        session = await questionnaire_sessions.get(user_email)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load session: {str(e)}")
+
+    return SessionResponse(
+        user_email=user_email,
+        chat_history=session.chat_history,
+        pending_question=session.pending_question,
+        question_number=len(session.chat_history) + (0 if session.completed else 1),
+        is_complete=session.completed
+    )
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.core.metrics import registry
+from app.core.tracing import collector
+import hmac
+import os
+
+router = APIRouter(tags=["metrics"])
+
+# Scrapers must send `Authorization: Bearer <token>`; unset disables /metrics and /traces
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+def check_metrics_token(authorization: Optional[str]):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    All in-process metrics in the Prometheus text format.
+    """
+    check_metrics_token(authorization)
+
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/traces")
+async def get_traces(
+    limit: int = 20,
+    min_duration_ms: float = 0,
+    name: Optional[str] = None,
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Recent sampled traces from this worker, newest first. Filter by root span name
+    (e.g. "POST /api/chat/next-question") or minimum duration to find slow requests.
+    """
+    check_metrics_token(authorization)
+
+    return {"traces": collector.recent(limit=limit, min_duration_ms=min_duration_ms, name=name)}
@@ -1,27 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.models.user_model import User
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.match_history import MatchHistory, MatchStatus
 from pydantic import BaseModel
 import json
 import os
 from pathlib import Path
 from typing import Optional
-from app.db.qdrant_client import qdrant, get_embedding
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from app.db.qdrant_client import has_embedding_async
+from app.core.user_cache import user_cache
+from app.db.database import get_db
 
 router = APIRouter()
 
 # Configuration - set these via environment variables or config
 ROUND1_RESULTS_PUBLISHED = os.getenv("ROUND1_RESULTS_PUBLISHED", "false").lower() == "true"
 MATCHES_JSON_PATH = os.getenv("MATCHES_JSON_PATH", "matches_20251029_043722.json")  # Default to latest
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
-db = SessionLocal()
 
 class MatchResult(BaseModel):
     name: str
@@ -74,7 +68,7 @@ def find_user_match(user_email: str, matches_data: dict):
     return None
 
 @router.get("/check-result", response_model=Round1ResultResponse)
-async def check_round1_result(email: str):
+async def check_round1_result(email: str, db: AsyncSession = Depends(get_db)):
     """
     Check Round 1 results for a user
     
@@ -93,7 +87,7 @@ async def check_round1_result(email: str):
         )
     
     # Check if user is registered
-    user = db.query(User).filter(User.email == email).first()
+    user = await user_cache.get_by_email(db, email)
     if not user:
         return Round1ResultResponse(
             status="not_registered",
@@ -104,22 +98,19 @@ async def check_round1_result(email: str):
     if user.name.endswith("_ROUND2"):
         # Check if user has embedding in vector DB
         try:
-            embedding = get_embedding(user.email)
-
-            has_embedding = embedding is not None
-            if has_embedding:
-                return Round1ResultResponse(
-                    status="waiting_for_results",
-                    message="Waiting for Round 2 results."
-                )
-        except Exception as e:
+            has_embedding = await has_embedding_async(user.email)
+        except Exception:
             # If Qdrant check fails, assume no embedding
-            pass
-        else:
+            has_embedding = False
+        if has_embedding:
             return Round1ResultResponse(
-                status="not_registered",
-                message="Redirecting to user form for Round 2 registration."
+                status="waiting_for_results",
+                message="Waiting for Round 2 results."
             )
+        return Round1ResultResponse(
+            status="not_registered",
+            message="Redirecting to user form for Round 2 registration."
+        )
 
     # Load matches JSON
     matches_file = get_latest_matches_json()
@@ -136,9 +127,10 @@ async def check_round1_result(email: str):
     match = find_user_match(email, matches_data)
     
     # Get user's match status from match_history
-    match_history = db.query(MatchHistory).filter(
-        MatchHistory.user_id == user.id
-    ).first()
+    result = await db.execute(
+        select(MatchHistory).where(MatchHistory.user_id == user.id)
+    )
+    match_history = result.scalars().first()
     
     # Safely get match status - handle None cases
     user_match_status = None
@@ -161,7 +153,8 @@ async def check_round1_result(email: str):
 
 @router.post("/update-match-status")
 async def update_match_status(
-    request: UpdateMatchStatusRequest
+    request: UpdateMatchStatusRequest,
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update user's match status based on Round 2 decision
@@ -171,7 +164,7 @@ async def update_match_status(
     """
     
     # Get user
-    user = db.query(User).filter(User.email == request.user_email).first()
+    user = await user_cache.get_by_email(db, request.user_email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -179,13 +172,13 @@ async def update_match_status(
     new_status = MatchStatus.PENDING if request.apply_round2 else MatchStatus.REJECTED
     
     # Update all match history records for this user
-    db.query(MatchHistory).filter(
-        MatchHistory.user_id == user.id
-    ).update({
-        "status": new_status
-    })
+    await db.execute(
+        update(MatchHistory)
+        .where(MatchHistory.user_id == user.id)
+        .values(status=new_status)
+    )
     
-    db.commit()
+    await db.commit()
     
     return {
         "success": True,
@@ -1,32 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends, Cookie
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from supabase import create_client
-import os
-from app.models.user_model import User
-from app.db.database import SessionLocal
-from app.db.qdrant_client import qdrant, get_embedding
+from app.db.database import get_db
+from app.core.embedding_jobs import get_latest_job, ACTIVE_STATUSES
+from app.db.qdrant_client import has_embedding_async, embedding_presence
+from app.models.embedding_job import EmbeddingJobStatus
+from app.core.auth_tokens import token_verifier, InvalidToken
+from app.core.resilience import DependencyUnavailable
+from app.api.auth import service_unavailable
+from app.core.user_cache import user_cache
 
 router = APIRouter(tags=["status"])
 
-# Initialize Supabase client
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-
-if not url or not key:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
-
-supabase = create_client(url, key)
-
-def get_db():
-    if SessionLocal is None:
-        raise HTTPException(status_code=503, detail="Database is not available")
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 async def verify_auth(access_token: Optional[str] = Cookie(None)):
     """Verify authentication using httpOnly cookie"""
@@ -34,19 +19,18 @@ async def verify_auth(access_token: Optional[str] = Cookie(None)):
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        # Verify token with Supabase
-        user_response = supabase.auth.get_user(access_token)
-        if not user_response or not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_response.user
-    except Exception as e:
+        # Verified locally against the cached signing keys; Supabase is only asked for unknown keys
+        return await token_verifier.verify(access_token)
+    except InvalidToken as e:
         raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
+    except DependencyUnavailable as e:
+        raise service_unavailable(e)
 
 
 @router.get("/user-status")
 async def check_user_status(
     email: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user = Depends(verify_auth)
 ):
     """
@@ -57,10 +41,12 @@ async def check_user_status(
     - has_embedding: bool - Whether user has embedding in Qdrant
     - redirect_to: str - Where to redirect: "form", "chat", or "complete"
     - user_id: int (optional) - User ID if exists in database
+    - embedding_status: str (optional) - Background embedding job status: "pending", "running",
+      "succeeded" or "failed"
     """
     
     # Check if user exists in database
-    user = db.query(User).filter(User.email == email).first()
+    user = await user_cache.get_by_email(db, email)
     
     if not user:
         # User doesn't exist in DB - needs to fill form
@@ -73,19 +59,38 @@ async def check_user_status(
     
     # User exists, now check if they have embedding in Qdrant
     try:
-        # Try to get user's embedding by email
-        embedding = get_embedding(user.email)
-        
-        has_embedding = embedding is not None
+        # Presence check only, the vector itself isn't needed here
+        has_embedding = await has_embedding_async(user.email)
         
         if not has_embedding:
+            job = await get_latest_job(db, user.email)
+            if job and job.status == EmbeddingJobStatus.SUCCEEDED:
+                # Jobs only succeed after their upsert is flushed, so a cached "absent" is stale
+                embedding_presence.invalidate(user.email)
+                has_embedding = await has_embedding_async(user.email)
+
+        if not has_embedding:
+            if job and job.status in ACTIVE_STATUSES:
+                # Questionnaire done, embedding still queued or running
+                return {
+                    "exists_in_db": True,
+                    "has_embedding": False,
+                    "redirect_to": "complete",
+                    "user_id": user.id,
+                    "embedding_status": job.status.value
+                }
+
             # User exists but no embedding - needs to chat
-            return {
+            response = {
                 "exists_in_db": True,
                 "has_embedding": False,
                 "redirect_to": "chat",
                 "user_id": user.id
             }
+            if job:
+                response["embedding_status"] = job.status.value
+                response["embedding_error"] = job.last_error
+            return response
         else:
             # User exists and has embedding - matching complete
             return {
@@ -96,7 +101,7 @@ async def check_user_status(
             }
             
     except Exception as e:
-        # If Qdrant check fails, assume no embedding and send to chat
+        # If Qdrant check fails (or its circuit breaker is open), assume no embedding and send to chat
         return {
             "exists_in_db": True,
             "has_embedding": False,
@@ -1,24 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel, Field, EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from app.models.user_model import User
-from app.db.database import SessionLocal
+from app.db.database import get_db
+from app.core.user_cache import user_cache
 
 router = APIRouter(tags=["users"])
 
 
-# Dependency to get DB session
-def get_db():
-    if SessionLocal is None:
-        raise HTTPException(status_code=503, detail="Database is not available")
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # Simple auth dependency - checks if Authorization header exists
 async def verify_auth(authorization: Optional[str] = Header(None)):
     if not authorization or not authorization.startswith("Bearer "):
@@ -55,16 +46,17 @@ class UserResponse(BaseModel):
 @router.post("/", response_model=UserResponse, status_code=201)
 async def create_user(
     user_data: CreateUserRequest, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     token: str = Depends(verify_auth)
 ):
     """
     Create a new user. Requires authentication.
     """
     # Check if user with this email or phone already exists
-    existing_user = db.query(User).filter(
-        (User.email == user_data.email) | (User.phone == user_data.phone)
-    ).first()
+    result = await db.execute(
+        select(User).where((User.email == user_data.email) | (User.phone == user_data.phone))
+    )
+    existing_user = result.scalars().first()
     
     if existing_user:
         if existing_user.email == user_data.email:
@@ -85,34 +77,36 @@ async def create_user(
     
     try:
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
+        user_cache.put(new_user)
         return new_user
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    user = await user_cache.get_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @router.delete("/{user_id}", status_code=204)
-async def delete_user(user_id: int, db: Session = Depends(get_db)):
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
     """
     Delete a user by their ID.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     try:
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await db.commit()
+        user_cache.invalidate(email=user.email, user_id=user.id)
         return None
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(e)}")
@@ -0,0 +1,155 @@
+"""
+Admission control for endpoints that call the LLM.
+At most LLM_ADMISSION_CONCURRENCY requests run at once; the rest wait in a
+bounded FIFO queue. A request that can't get in before
+LLM_ADMISSION_QUEUE_TIMEOUT, or that finds the queue full, is rejected with
+Saturated. The API turns that into 503 with Retry-After, so under a burst
+some users are asked to retry instead of everyone timing out together.
+
+The controller lives in each worker process, not across the deployment: the
+effective limit is LLM_ADMISSION_CONCURRENCY x workers (likewise for the
+queue size), so size it with the worker count in mind.
+"""
+
+from collections import deque
+from typing import Optional
+from app.core.metrics import registry
+import asyncio
+import math
+import time
+import os
+
+LLM_ADMISSION_CONCURRENCY = int(os.getenv("LLM_ADMISSION_CONCURRENCY", "32"))
+LLM_ADMISSION_QUEUE_SIZE = int(os.getenv("LLM_ADMISSION_QUEUE_SIZE", "256"))
+LLM_ADMISSION_QUEUE_TIMEOUT = float(os.getenv("LLM_ADMISSION_QUEUE_TIMEOUT", "2"))
+
+admission_queue_depth = registry.gauge(
+    "admission_queue_depth",
+    "Requests waiting for admission",
+    ("pool",)
+)
+admission_in_flight = registry.gauge(
+    "admission_in_flight",
+    "Admitted requests still running",
+    ("pool",)
+)
+admission_wait_seconds = registry.histogram(
+    "admission_wait_seconds",
+    "Time spent queued before admission or rejection",
+    ("pool", "outcome")
+)
+admission_rejections = registry.counter(
+    "admission_rejections_total",
+    "Requests turned away (queue_full, timeout)",
+    ("pool", "reason")
+)
+
+
+class Saturated(Exception):
+    def __init__(self, pool: str, reason: str, retry_after: int):
+        super().__init__(f"{pool} is saturated ({reason})")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """An admitted request's slot. release() is idempotent"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.admitted_at = time.perf_counter()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(time.perf_counter() - self.admitted_at)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = LLM_ADMISSION_CONCURRENCY,
+        max_queue: int = LLM_ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = LLM_ADMISSION_QUEUE_TIMEOUT
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self._service_time: Optional[float] = None  # Moving average of how long a slot is held
+
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current queue drains"""
+        if self._service_time is None:
+            return max(1, math.ceil(self.queue_timeout))
+        backlog = (len(self._waiters) + 1) * self._service_time / self.max_concurrency
+        return max(1, math.ceil(backlog))
+
+    def _update_gauges(self):
+        admission_queue_depth.set(len(self._waiters), pool=self.name)
+        admission_in_flight.set(self.in_flight, pool=self.name)
+
+    def _reject(self, reason: str, waited: float):
+        admission_rejections.inc(pool=self.name, reason=reason)
+        admission_wait_seconds.observe(waited, pool=self.name, outcome=reason)
+        raise Saturated(self.name, reason, self.retry_after())
+
+    def _admitted(self, waited: float) -> AdmissionTicket:
+        admission_wait_seconds.observe(waited, pool=self.name, outcome="admitted")
+        self._update_gauges()
+        return AdmissionTicket(self)
+
+    def _release(self, held: Optional[float]):
+        if held is not None:
+            self._service_time = held if self._service_time is None else 0.9 * self._service_time + 0.1 * held
+        # Hand the slot straight to the longest waiter, so newcomers can't jump the queue
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    async def acquire(self) -> AdmissionTicket:
+        """Wait for a slot; raises Saturated if the queue is full or the wait runs past queue_timeout"""
+        started = time.perf_counter()
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return self._admitted(0.0)
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", 0.0)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release(None)
+            else:
+                future.cancel()
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+                self._update_gauges()
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", time.perf_counter() - started)
+            raise
+        return self._admitted(time.perf_counter() - started)
+
+
+# Admission controller for LLM-bound endpoints (one per worker process)
+llm_admission = AdmissionController("llm")
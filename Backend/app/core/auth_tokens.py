@@ -0,0 +1,263 @@
+"""
+Local verification of Supabase access tokens.
+Signatures and expiry are checked in-process, with SUPABASE_JWT_SECRET for
+HS256 projects or the project's JWKS (fetched once and refreshed in the
+background) for asymmetric keys. Verified tokens are kept in a small TTL
+cache. The remote supabase.auth.get_user call is only made when the token is
+signed with a key we don't have.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from jose import jwt
+from jose.exceptions import JOSEError
+from app.core.metrics import registry
+from app.utils.supabase_client import get_supabase, supabase_guard
+from app.core.resilience import DependencyUnavailable
+from app.core.tracing import span
+from app.utils.http_transport import get_async_transport, client_timeout
+import threading
+import hashlib
+import logging
+import asyncio
+import httpx
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+# Legacy HS256 projects sign with the shared JWT secret; leave unset to rely on JWKS
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv(
+    "SUPABASE_JWKS_URL",
+    f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else ""
+)
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_REFRESH_SECONDS = float(os.getenv("JWKS_REFRESH_SECONDS", "600"))
+# Minimum gap between refreshes triggered by an unknown key id
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_SECONDS", "30"))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
+# Algorithms accepted for JWKS keys; the token header's own "alg" is never trusted
+JWKS_ALGORITHMS = ("RS256", "ES256")
+
+auth_verifications = registry.counter(
+    "auth_verifications_total",
+    "Access token verifications by method (cache, local, remote) and outcome",
+    ("method", "outcome")
+)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class UnknownSigningKey(Exception):
+    pass
+
+
+@dataclass
+class AuthUser:
+    id: str
+    email: Optional[str]
+    user_metadata: Dict = field(default_factory=dict)
+    app_metadata: Dict = field(default_factory=dict)
+    created_at: Optional[str] = None  # Not part of the JWT; only set when verified remotely
+
+
+def user_from_claims(claims: Dict) -> AuthUser:
+    return AuthUser(
+        id=claims.get("sub"),
+        email=claims.get("email"),
+        user_metadata=claims.get("user_metadata") or {},
+        app_metadata=claims.get("app_metadata") or {}
+    )
+
+
+def user_from_supabase(user) -> AuthUser:
+    return AuthUser(
+        id=user.id,
+        email=user.email,
+        user_metadata=user.user_metadata or {},
+        app_metadata=user.app_metadata or {},
+        created_at=str(user.created_at) if user.created_at else None
+    )
+
+
+class TokenVerifier:
+    def __init__(
+        self,
+        jwt_secret: Optional[str] = SUPABASE_JWT_SECRET,
+        jwks_url: str = SUPABASE_JWKS_URL,
+        cache_size: int = AUTH_TOKEN_CACHE_SIZE,
+        cache_ttl: float = AUTH_TOKEN_CACHE_TTL
+    ):
+        self.jwt_secret = jwt_secret
+        self.jwks_url = jwks_url
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # token hash -> (user, expires_at)
+        self._cache_lock = threading.Lock()
+        self._keys: Dict[str, Dict] = {}  # kid -> JWK
+        self._keys_fetched_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # Verified token cache
+
+    @staticmethod
+    def _cache_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _cached(self, token: str) -> Optional[AuthUser]:
+        key = self._cache_key(token)
+        with self._cache_lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            user, expires_at = item
+            if expires_at <= time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return user
+
+    def _remember(self, token: str, user: AuthUser, token_exp: Optional[float]):
+        expires_at = time.time() + self.cache_ttl
+        if token_exp:
+            expires_at = min(expires_at, token_exp)
+        with self._cache_lock:
+            self._cache[self._cache_key(token)] = (user, expires_at)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """Forget a token, e.g. on logout"""
+        with self._cache_lock:
+            self._cache.pop(self._cache_key(token), None)
+
+    # Signing keys
+
+    async def refresh_keys(self):
+        if not self.jwks_url:
+            return
+        with span("supabase.jwks") as current:
+            async with supabase_guard.guard():
+                async with httpx.AsyncClient(transport=get_async_transport(), timeout=client_timeout(5)) as http:
+                    response = await http.get(self.jwks_url)
+                    response.raise_for_status()
+            current.set(response_bytes=len(response.content))
+        keys = {key["kid"]: key for key in response.json().get("keys", []) if key.get("kid")}
+        self._keys = keys
+        self._keys_fetched_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh_keys_quietly())
+
+    async def refresh_keys_quietly(self):
+        """refresh_keys that logs failures instead of raising"""
+        try:
+            await self.refresh_keys()
+        except Exception as e:
+            logger.warning("JWKS refresh failed: %s", e)
+
+    async def _signing_key(self, header: Dict):
+        algorithm = header.get("alg", "")
+        if algorithm.startswith("HS"):
+            if not self.jwt_secret:
+                raise UnknownSigningKey("No JWT secret configured")
+            return self.jwt_secret
+
+        kid = header.get("kid")
+        age = time.monotonic() - self._keys_fetched_at
+        if kid in self._keys:
+            if age > JWKS_REFRESH_SECONDS:
+                self._refresh_in_background()
+            return self._keys[kid]
+
+        # Unknown key id: the keys may have rotated, refresh now (at most every JWKS_MIN_REFRESH_SECONDS)
+        if age > JWKS_MIN_REFRESH_SECONDS:
+            self._refresh_in_background()
+            await asyncio.shield(self._refresh_task)
+        if kid in self._keys:
+            return self._keys[kid]
+        raise UnknownSigningKey(f"Unknown signing key: {kid}")
+
+    # Verification
+
+    @staticmethod
+    def _algorithms(key):
+        """Algorithms allowed for the key, fixed server-side rather than taken from the token"""
+        if isinstance(key, str):
+            return ["HS256"]  # Only reached when jwt_secret is configured
+        if key.get("alg") in JWKS_ALGORITHMS:
+            return [key["alg"]]
+        return list(JWKS_ALGORITHMS)
+
+    def _verify_locally(self, token: str, header: Dict, key) -> Dict:
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=self._algorithms(key),
+                audience=SUPABASE_JWT_AUDIENCE
+            )
+        except JOSEError as e:
+            # Also covers JWKError, e.g. a header "alg" that doesn't fit the key
+            raise InvalidToken(str(e))
+
+    async def _verify_remotely(self, token: str) -> AuthUser:
+        response = await supabase_guard.run_sync(get_supabase().auth.get_user, token)
+        if not response or not response.user:
+            raise InvalidToken("Invalid token")
+        return user_from_supabase(response.user)
+
+    async def verify(self, token: str) -> AuthUser:
+        """
+        Return the token's user, or raise InvalidToken. Raises DependencyUnavailable if
+        the token needs a remote check while Supabase's circuit breaker is open.
+        """
+        user = self._cached(token)
+        if user is not None:
+            auth_verifications.inc(method="cache", outcome="ok")
+            return user
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except JOSEError as e:
+            auth_verifications.inc(method="local", outcome="invalid")
+            raise InvalidToken(str(e))
+
+        try:
+            key = await self._signing_key(header)
+        except UnknownSigningKey:
+            try:
+                user = await self._verify_remotely(token)
+            except InvalidToken:
+                auth_verifications.inc(method="remote", outcome="invalid")
+                raise
+            except DependencyUnavailable:
+                auth_verifications.inc(method="remote", outcome="unavailable")
+                raise
+            except Exception as e:
+                auth_verifications.inc(method="remote", outcome="invalid")
+                raise InvalidToken(str(e))
+            auth_verifications.inc(method="remote", outcome="ok")
+            self._remember(token, user, jwt.get_unverified_claims(token).get("exp"))
+            return user
+
+        try:
+            claims = self._verify_locally(token, header, key)
+        except InvalidToken:
+            auth_verifications.inc(method="local", outcome="invalid")
+            raise
+        auth_verifications.inc(method="local", outcome="ok")
+        user = user_from_claims(claims)
+        self._remember(token, user, claims.get("exp"))
+        return user
+
+
+# Global token verifier instance
+token_verifier = TokenVerifier()
@@ -0,0 +1,105 @@
+"""
+Registry of shared clients (database engines, Qdrant, OpenAI, Supabase).
+Each client is created on first use rather than at import, once per process,
+so importing the app needs no live services. The FastAPI lifespan can warm
+clients up in parallel and closes whatever was opened on shutdown. Tests can
+swap in fakes with override().
+"""
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+import threading
+import inspect
+import logging
+import asyncio
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClientSpec:
+    factory: Callable[[], Any]
+    close: Optional[Callable[[Any], Any]] = None  # May return an awaitable
+    warmup: Optional[Callable[[Any], Awaitable[Any]]] = None  # Cheap round trip to open connections
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._specs: Dict[str, ClientSpec] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        close: Optional[Callable[[Any], Any]] = None,
+        warmup: Optional[Callable[[Any], Awaitable[Any]]] = None
+    ):
+        self._specs[name] = ClientSpec(factory, close, warmup)
+
+    def get(self, name: str) -> Any:
+        """Return the shared client, creating it on first use"""
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = self._specs[name].factory()
+            return self._instances[name]
+
+    def override(self, name: str, instance: Any):
+        """Replace a client, e.g. with a fake in tests"""
+        with self._lock:
+            self._instances[name] = instance
+
+    def initialized(self) -> Iterable[str]:
+        return list(self._instances)
+
+    async def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, Optional[str]]:
+        """
+        Create the given clients (default: all registered) concurrently and run their warm-up
+        round trips. Failures are logged and returned, not raised, so a missing service
+        doesn't stop the app from starting.
+        """
+        names = list(names) if names is not None else list(self._specs)
+
+        async def warm(name: str) -> Optional[str]:
+            started = time.perf_counter()
+            try:
+                # Client constructors may block (DNS, TLS setup), keep them off the event loop
+                instance = await asyncio.to_thread(self.get, name)
+                spec = self._specs[name]
+                if instance is not None and spec.warmup is not None:
+                    await spec.warmup(instance)
+            except Exception as e:
+                logger.warning("Warm-up of %s failed: %s", name, e)
+                return str(e)
+            logger.info("Warmed up %s in %.0f ms", name, (time.perf_counter() - started) * 1000)
+            return None
+
+        results = await asyncio.gather(*(warm(name) for name in names))
+        return dict(zip(names, results))
+
+    async def aclose(self):
+        """Close every client that was created, in reverse creation order"""
+        with self._lock:
+            instances = list(self._instances.items())
+            self._instances.clear()
+
+        for name, instance in reversed(instances):
+            spec = self._specs.get(name)
+            if instance is None or spec is None or spec.close is None:
+                continue
+            try:
+                result = spec.close(instance)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning("Closing %s failed: %s", name, e)
+
+
+# Global client registry instance
+clients = ClientRegistry()
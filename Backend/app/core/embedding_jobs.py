@@ -0,0 +1,191 @@
+"""
+Background queue for post-questionnaire embedding.
+Completing the questionnaire enqueues a job row in Postgres instead of
+embedding inline. An in-process pool of workers claims due jobs, runs
+process_and_embed_chat, and retries failures with exponential backoff.
+"""
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, or_, and_
+from typing import List, Dict, Optional
+from app.db.database import async_session, has_database
+from app.models.embedding_job import EmbeddingJob, EmbeddingJobStatus
+from app.core.tracing import span
+import asyncio
+import logging
+import random
+import os
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "4"))
+EMBEDDING_JOB_MAX_ATTEMPTS = int(os.getenv("EMBEDDING_JOB_MAX_ATTEMPTS", "5"))
+EMBEDDING_JOB_BACKOFF_SECONDS = float(os.getenv("EMBEDDING_JOB_BACKOFF_SECONDS", "2"))
+EMBEDDING_JOB_MAX_BACKOFF_SECONDS = float(os.getenv("EMBEDDING_JOB_MAX_BACKOFF_SECONDS", "300"))
+EMBEDDING_JOB_POLL_SECONDS = float(os.getenv("EMBEDDING_JOB_POLL_SECONDS", "2"))
+# Jobs left RUNNING longer than this (e.g. the worker process died) are picked up again
+EMBEDDING_JOB_LEASE_SECONDS = float(os.getenv("EMBEDDING_JOB_LEASE_SECONDS", "300"))
+
+ACTIVE_STATUSES = (EmbeddingJobStatus.PENDING, EmbeddingJobStatus.RUNNING)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of failed attempts"""
+    delay = min(EMBEDDING_JOB_BACKOFF_SECONDS * (2 ** (attempts - 1)), EMBEDDING_JOB_MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def enqueue_embedding_job(user_email: str, chat_history: List[Dict[str, str]]) -> EmbeddingJob:
+    """
+    Persist an embedding job for the user and wake the workers.
+    A resent chat reuses the user's active job instead of queueing a duplicate.
+    """
+    async with async_session() as db:
+        result = await db.execute(
+            select(EmbeddingJob)
+            .where(EmbeddingJob.user_email == user_email, EmbeddingJob.status.in_(ACTIVE_STATUSES))
+            .order_by(EmbeddingJob.id.desc())
+        )
+        job = result.scalars().first()
+
+        if not job or job.chat_history != chat_history:
+            job = EmbeddingJob(
+                user_email=user_email,
+                chat_history=chat_history,
+                status=EmbeddingJobStatus.PENDING,
+                attempts=0,
+                next_attempt_at=_now()
+            )
+            db.add(job)
+            await db.commit()
+
+    embedding_worker_pool.notify()
+    return job
+
+
+async def get_latest_job(db, user_email: str) -> Optional[EmbeddingJob]:
+    result = await db.execute(
+        select(EmbeddingJob)
+        .where(EmbeddingJob.user_email == user_email)
+        .order_by(EmbeddingJob.id.desc())
+    )
+    return result.scalars().first()
+
+
+class EmbeddingWorkerPool:
+    """In-process workers that drain the embedding_jobs table"""
+
+    def __init__(self, workers: int = EMBEDDING_WORKERS):
+        self.workers = workers
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+
+    async def start(self):
+        if self._tasks or not has_database():
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"✅ Started {self.workers} embedding workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers so a new job doesn't wait for the next poll"""
+        self._wakeup.set()
+
+    async def _claim(self) -> Optional[EmbeddingJob]:
+        """Mark the oldest due job as running. SKIP LOCKED keeps workers in other processes apart"""
+        now = _now()
+        async with async_session() as db:
+            result = await db.execute(
+                select(EmbeddingJob)
+                .where(or_(
+                    and_(
+                        EmbeddingJob.status == EmbeddingJobStatus.PENDING,
+                        EmbeddingJob.next_attempt_at <= now
+                    ),
+                    and_(
+                        EmbeddingJob.status == EmbeddingJobStatus.RUNNING,
+                        EmbeddingJob.updated_at < now - timedelta(seconds=EMBEDDING_JOB_LEASE_SECONDS)
+                    )
+                ))
+                .order_by(EmbeddingJob.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            job = result.scalars().first()
+            if not job:
+                return None
+
+            job.status = EmbeddingJobStatus.RUNNING
+            job.attempts = (job.attempts or 0) + 1
+            job.updated_at = now
+            await db.commit()
+            return job
+
+    async def _finish(self, job: EmbeddingJob, status: EmbeddingJobStatus, error: str = None, retry_at=None):
+        values = {"status": status, "last_error": error, "updated_at": _now()}
+        if retry_at:
+            values["next_attempt_at"] = retry_at
+        async with async_session() as db:
+            await db.execute(update(EmbeddingJob).where(EmbeddingJob.id == job.id).values(**values))
+            await db.commit()
+
+    async def _run(self, job: EmbeddingJob):
+        # Imported here because llm_questionnaire enqueues jobs from this module
+        from app.core.llm_questionnaire import process_and_embed_chat
+
+        try:
+            # Root span for the job's OpenAI, Qdrant and database calls
+            with span("embedding_job", job_id=job.id, attempt=job.attempts):
+                result = await process_and_embed_chat(job.user_email, job.chat_history)
+        except Exception as e:
+            if job.attempts >= EMBEDDING_JOB_MAX_ATTEMPTS:
+                logger.error(f"Embedding job {job.id} failed after {job.attempts} attempts: {e}")
+                await self._finish(job, EmbeddingJobStatus.FAILED, str(e))
+            else:
+                retry_at = _now() + timedelta(seconds=backoff_delay(job.attempts))
+                await self._finish(job, EmbeddingJobStatus.PENDING, str(e), retry_at)
+            return
+
+        if result.get("status") == "success":
+            await self._finish(job, EmbeddingJobStatus.SUCCEEDED)
+        else:
+            # Bad input (e.g. no answers) won't get better on retry
+            await self._finish(job, EmbeddingJobStatus.FAILED, result.get("message"))
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Failed to claim embedding job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=EMBEDDING_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Embedding job {job.id} crashed: {e}")
+
+
+# Global worker pool instance
+embedding_worker_pool = EmbeddingWorkerPool()
@@ -0,0 +1,146 @@
+"""
+Latency budget for LLM calls on the request path.
+`call_with_budget` bounds a call by a hard deadline and can fire a hedged
+second attempt once the first has run longer than the recent p95, taking
+whichever answers first. Callers switch to their fallback as soon as the
+budget is spent instead of waiting on the provider's own timeout.
+
+Attempt latency is measured from when the call holds its concurrency slot, so
+queueing under load doesn't push the p95 (and with it the hedge) later. A hedge
+is skipped while no slot is free, since it would only queue behind the rest.
+"""
+
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+from app.core.metrics import registry
+import asyncio
+import time
+import os
+
+T = TypeVar("T")
+
+QUESTION_DEADLINE_SECONDS = float(os.getenv("QUESTION_DEADLINE_SECONDS", "6"))
+QUESTION_HEDGE_ENABLED = os.getenv("QUESTION_HEDGE_ENABLED", "true").lower() == "true"
+# Hedge delay used until enough samples exist to estimate p95
+QUESTION_HEDGE_DEFAULT_DELAY = float(os.getenv("QUESTION_HEDGE_DEFAULT_DELAY", "2.5"))
+QUESTION_HEDGE_MIN_DELAY = float(os.getenv("QUESTION_HEDGE_MIN_DELAY", "0.5"))
+QUESTION_HEDGE_MIN_SAMPLES = int(os.getenv("QUESTION_HEDGE_MIN_SAMPLES", "20"))
+
+llm_attempt_seconds = registry.histogram(
+    "llm_attempt_seconds",
+    "Latency of individual successful LLM attempts",
+    ("operation",)
+)
+llm_budget_seconds = registry.histogram(
+    "llm_budget_seconds",
+    "End-to-end latency of budgeted LLM calls, including hedging",
+    ("operation", "outcome")
+)
+llm_hedges_total = registry.counter(
+    "llm_hedges_total",
+    "Hedged second attempts fired",
+    ("operation",)
+)
+llm_hedges_skipped_total = registry.counter(
+    "llm_hedges_skipped_total",
+    "Hedged second attempts skipped because no concurrency slot was free",
+    ("operation",)
+)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class LatencyTracker:
+    """Recent attempt latencies for one operation, used to pick the hedge delay"""
+
+    def __init__(self, operation: str, window: int = 200):
+        self.operation = operation
+        self._recent = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._recent.append(seconds)
+        llm_attempt_seconds.observe(seconds, operation=self.operation)
+
+    def p95(self) -> Optional[float]:
+        if len(self._recent) < QUESTION_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_delay(self) -> Optional[float]:
+        if not QUESTION_HEDGE_ENABLED:
+            return None
+        p95 = self.p95()
+        if p95 is None:
+            return QUESTION_HEDGE_DEFAULT_DELAY
+        return max(QUESTION_HEDGE_MIN_DELAY, p95)
+
+
+async def _timed(call: Callable[[Callable[[], None]], Awaitable[T]], tracker: LatencyTracker) -> T:
+    started = time.perf_counter()
+
+    def admitted():
+        nonlocal started
+        started = time.perf_counter()
+
+    result = await call(admitted)
+    tracker.record(time.perf_counter() - started)
+    return result
+
+
+async def call_with_budget(
+    call: Callable[[Callable[[], None]], Awaitable[T]],
+    tracker: LatencyTracker,
+    deadline: float = QUESTION_DEADLINE_SECONDS,
+    hedge_after: Optional[float] = None,
+    can_hedge: Optional[Callable[[], bool]] = None
+) -> T:
+    """
+    Run `call(admitted)` within `deadline` seconds, starting a second attempt after
+    `hedge_after` seconds if the first hasn't finished and `can_hedge()` allows it.
+    `call` invokes `admitted()` once it holds its concurrency slot; the attempt's
+    latency is recorded from there. Raises DeadlineExceeded when the budget runs
+    out, or the last attempt's error if every attempt fails.
+    """
+    started = time.perf_counter()
+    tasks = {asyncio.ensure_future(_timed(call, tracker))}
+    hedge_pending = hedge_after is not None
+    outcome = "error"
+
+    try:
+        while True:
+            elapsed = time.perf_counter() - started
+            remaining = deadline - elapsed
+            if remaining <= 0:
+                outcome = "deadline"
+                raise DeadlineExceeded(f"{tracker.operation} exceeded {deadline}s budget")
+
+            timeout = min(remaining, max(0.0, hedge_after - elapsed)) if hedge_pending else remaining
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            error = None
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    outcome = "ok" if hedge_pending or hedge_after is None else "hedged"
+                    return task.result()
+                error = task.exception()
+
+            if error is not None and not tasks:
+                raise error
+
+            if hedge_pending and time.perf_counter() - started >= hedge_after:
+                hedge_pending = False
+                if can_hedge is None or can_hedge():
+                    llm_hedges_total.inc(operation=tracker.operation)
+                    tasks.add(asyncio.ensure_future(_timed(call, tracker)))
+                else:
+                    llm_hedges_skipped_total.inc(operation=tracker.operation)
+    finally:
+        for task in tasks:
+            task.cancel()
+        llm_budget_seconds.observe(
+            time.perf_counter() - started, operation=tracker.operation, outcome=outcome
+        )
@@ -1,64 +1,135 @@
-import os
-from openai import OpenAI
-from app.db.qdrant_client import store_embedding
-from app.utils.embeddings import get_text_embedding
+from app.db.qdrant_client import store_embedding_async, get_chat_hash_async
+from app.db.database import has_database
+from app.core.embedding_jobs import enqueue_embedding_job
+from app.core.question_pool import question_pool
+from app.core.prompt_compaction import compact_context, full_context_tokens, record_context_tokens
+from app.core.latency_budget import (
+    LatencyTracker,
+    DeadlineExceeded,
+    call_with_budget,
+    QUESTION_DEADLINE_SECONDS
+)
+from app.utils.embeddings import embedding_batcher
+from app.utils.embedding_providers import get_embedding_provider
+from app.utils.embedding_cache import normalize_text
+from app.utils.openai_client import get_openai, openai_slot, openai_guard, OPENAI_CHAT_TIMEOUT
+from app.core.tracing import span, start_span
 import numpy as np
-from typing import List, Dict
+import hashlib
+import asyncio
+import time
+import json
+from typing import Callable, List, Dict, Optional, Tuple
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+def chat_hash(answers: List[str], model_version: Optional[str] = None) -> str:
+    """Hash of the embedding model version plus the normalized answers that feed the user's vector"""
+    model_version = model_version or get_embedding_provider().model_version
+    content = json.dumps([model_version] + [normalize_text(answer) for answer in answers])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
-def process_and_embed_chat(user_email: str, chat_history: List[Dict[str, str]]):
-    if not chat_history or len(chat_history) == 0:
-        return {"status": "error", "message": "Chat history is empty"}
-    
+
+def split_answers(chat_history: List[Dict[str, str]]) -> Tuple[List[str], List[str]]:
+    """Non-empty answers to the personality questions (first five) and the social-energy ones"""
     personality_answers = []
     social_answers = []
     
-    for idx, entry in enumerate(chat_history):
+    for idx, entry in enumerate(chat_history or []):
         answer = entry.get("a", "")
         if answer:
             if idx < 5:
                 personality_answers.append(answer)
             else:
                 social_answers.append(answer)
+    return personality_answers, social_answers
+
+
+def combine_vectors(personality_vec, social_vec) -> Optional[np.ndarray]:
+    """The user's vector: the mean of both sub-vectors, or whichever one exists"""
+    if personality_vec and social_vec:
+        return np.mean([personality_vec, social_vec], axis=0)
+    elif personality_vec:
+        return np.array(personality_vec)
+    elif social_vec:
+        return np.array(social_vec)
+    return None
+
+
+async def process_and_embed_chat(user_email: str, chat_history: List[Dict[str, str]]):
+    with span("questionnaire.embed_chat", answers=len(chat_history or [])):
+        return await _process_and_embed_chat(user_email, chat_history)
+
+
+async def _process_and_embed_chat(user_email: str, chat_history: List[Dict[str, str]]):
+    if not chat_history or len(chat_history) == 0:
+        return {"status": "error", "message": "Chat history is empty"}
     
+    personality_answers, social_answers = split_answers(chat_history)
     personality_text = " ".join(personality_answers) if personality_answers else ""
     social_text = " ".join(social_answers) if social_answers else ""
+    answers_processed = len(personality_answers) + len(social_answers)
+
+    # Skip re-embedding when the stored vector already came from these exact answers
+    current_hash = chat_hash(personality_answers + social_answers)
+    if answers_processed and await get_chat_hash_async(user_email) == current_hash:
+        return {
+            "status": "success",
+            "message": "Chat already embedded",
+            "user_email": user_email,
+            "answers_processed": answers_processed
+        }
     
-    personality_vec = get_text_embedding(personality_text) if personality_text else []
-    social_vec = get_text_embedding(social_text) if social_text else []
+    # Both sub-texts go out together (and with other users' texts) in one batched request
+    personality_vec, social_vec = await embedding_batcher.embed([personality_text, social_text])
     
-    if personality_vec and social_vec:
-        final_vec = np.mean([personality_vec, social_vec], axis=0)
-    elif personality_vec:
-        final_vec = np.array(personality_vec)
-    elif social_vec:
-        final_vec = np.array(social_vec)
-    else:
+    final_vec = combine_vectors(personality_vec, social_vec)
+    if final_vec is None:
         return {"status": "error", "message": "No valid answers to embed"}
     
-    store_embedding(vector=final_vec, user_email=user_email)
+    await store_embedding_async(
+        vector=final_vec,
+        user_email=user_email,
+        chat_hash=current_hash,
+        model_version=get_embedding_provider().model_version
+    )
     
     return {
         "status": "success",
         "message": "Chat embedded and stored successfully",
         "user_email": user_email,
-        "answers_processed": len(personality_answers) + len(social_answers)
+        "answers_processed": answers_processed
     }
 
 
-def embed_full_chat(user_email: str, full_chat_text: str):
+async def embed_full_chat(user_email: str, full_chat_text: str):
+    with span("questionnaire.embed_full_chat", chars=len(full_chat_text or "")):
+        return await _embed_full_chat(user_email, full_chat_text)
+
+
+async def _embed_full_chat(user_email: str, full_chat_text: str):
     if not full_chat_text or len(full_chat_text.strip()) == 0:
         return {"status": "error", "message": "Chat text is empty"}
+
+    current_hash = chat_hash([full_chat_text])
+    if await get_chat_hash_async(user_email) == current_hash:
+        return {
+            "status": "success",
+            "message": "Chat already embedded",
+            "user_email": user_email
+        }
     
-    chat_vector = get_text_embedding(full_chat_text)
+    chat_vector, = await embedding_batcher.embed([full_chat_text])
     
     if not chat_vector:
         return {"status": "error", "message": "Failed to generate embedding"}
     
     final_vec = np.array(chat_vector)
-    store_embedding(vector=final_vec, user_email=user_email)
+    await store_embedding_async(
+        vector=final_vec,
+        user_email=user_email,
+        chat_hash=current_hash,
+        model_version=get_embedding_provider().model_version
+    )
     
     return {
         "status": "success",
@@ -67,60 +138,107 @@ def embed_full_chat(user_email: str, full_chat_text: str):
     }
 
 
-def generate_next_question(chat_history: List[Dict[str, str]], user_email: str = None) -> Dict:
-    current_count = len(chat_history)
+# Fallback questions if LLM fails
+FALLBACK_QUESTIONS = {
+    0: "What are the most important values you look for in a partner?",
+    1: "How would your closest friends describe your personality?",
+    2: "What does your ideal relationship look like?",
+    3: "How do you typically handle disagreements or conflicts?",
+    4: "What are your long-term goals in life and love?",
+    5: "How do you like to spend your free time?",
+    6: "Are you more of an introvert, extrovert, or somewhere in between?",
+    7: "What kind of activities energize you the most?",
+    8: "Describe your perfect weekend.",
+    9: "What hobbies or interests are you passionate about?"
+}
+
+
+def clean_question(text: str) -> str:
+    question = text.strip()
     
-    # Determine if questionnaire is complete
-    if current_count >= 10:
-        # Auto-embed if user_email provided
-        embedding_result = None
-        if user_email:
+    # Remove quotes if LLM added them
+    if question.startswith('"') and question.endswith('"'):
+        question = question[1:-1]
+    if question.startswith("'") and question.endswith("'"):
+        question = question[1:-1]
+    return question
+
+
+def fallback_response(current_count: int, category: str) -> Dict:
+    return {
+        "question": FALLBACK_QUESTIONS.get(current_count, "Tell me more about yourself."),
+        "is_complete": False,
+        "question_number": current_count + 1,
+        "total_questions": 10,
+        "category": category,
+        "note": "Using fallback question due to LLM error"
+    }
+
+
+async def complete_questionnaire(chat_history: List[Dict[str, str]], user_email: str = None) -> Dict:
+    current_count = len(chat_history)
+    response = {
+        "question": None,
+        "is_complete": True,
+        "question_number": current_count,
+        "total_questions": 10,
+        "message": "Questionnaire complete! Profile created and ready to find matches."
+    }
+    if user_email:
+        if has_database():
+            # Embed in the background so the response doesn't wait on OpenAI and Qdrant
             try:
-                embedding_result = process_and_embed_chat(user_email, chat_history)
+                await enqueue_embedding_job(user_email, chat_history)
             except Exception as e:
-                return {
-                    "question": None,
-                    "is_complete": True,
-                    "question_number": current_count,
-                    "total_questions": 10,
-                    "message": "Questionnaire complete but embedding failed. Please try manually.",
-                    "embedding_error": str(e)
-                }
-        
-        response = {
-            "question": None,
-            "is_complete": True,
-            "question_number": current_count,
-            "total_questions": 10,
-            "message": "Questionnaire complete! Profile created and ready to find matches."
-        }
-        
-        # Add embedding status
-        if embedding_result:
-            if embedding_result.get("status") == "success":
-                response["embedding_status"] = "success"
-                response["user_email"] = embedding_result.get("user_email")
-                response["answers_processed"] = embedding_result.get("answers_processed")
-            else:
-                response["embedding_status"] = "error"
-                response["embedding_error"] = embedding_result.get("message")
-        
-        return response
+                response["message"] = "Questionnaire complete but embedding failed. Please try manually."
+                response["embedding_error"] = str(e)
+                return response
+            response["embedding_status"] = "queued"
+            response["user_email"] = user_email
+            response["answers_processed"] = sum(1 for entry in chat_history if entry.get("a"))
+            return response
+
+        # No job table without a database, so embed inline
+        try:
+            embedding_result = await process_and_embed_chat(user_email, chat_history)
+        except Exception as e:
+            response["message"] = "Questionnaire complete but embedding failed. Please try manually."
+            response["embedding_error"] = str(e)
+            return response
+
+        if embedding_result.get("status") == "success":
+            response["embedding_status"] = "success"
+            response["user_email"] = embedding_result.get("user_email")
+            response["answers_processed"] = embedding_result.get("answers_processed")
+        else:
+            response["embedding_status"] = "error"
+            response["embedding_error"] = embedding_result.get("message")
     
-    # Determine category based on question number
+    return response
+
+
+def question_category(current_count: int) -> Tuple[str, str]:
+    """Category and its description for the question after `current_count` answers"""
     if current_count < 5:
-        category = "personality"
-        category_description = "personality, core values, relationship goals, emotional traits, life priorities"
-    else:
-        category = "social_energy"
-        category_description = "social activities, lifestyle preferences, energy levels, hobbies, how they spend time"
+        return "personality", "personality, core values, relationship goals, emotional traits, life priorities"
+    return "social_energy", "social activities, lifestyle preferences, energy levels, hobbies, how they spend time"
+
+
+def build_question_prompt(chat_history: List[Dict[str, str]], session=None):
+    """
+    Return the question category and the chat messages for the next question.
+    With a server-side ChatSession, its incrementally built context and token
+    counts are used; otherwise the history is compacted and counted here.
+    """
+    current_count = len(chat_history)
+    category, category_description = question_category(current_count)
     
     # Build conversation context for LLM
-    conversation_context = ""
-    if chat_history:
-        conversation_context = "Previous conversation:\n"
-        for i, entry in enumerate(chat_history, 1):
-            conversation_context += f"Q{i}: {entry.get('q', '')}\nA{i}: {entry.get('a', '')}\n\n"
+    if session is not None:
+        conversation_context = session.prompt_context()
+    else:
+        conversation_context = compact_context(chat_history)
+        record_context_tokens(full_context_tokens(chat_history), conversation_context)
     
     # Create LLM prompt
     if current_count == 0:
@@ -161,27 +279,107 @@ def generate_next_question(chat_history: List[Dict[str, str]], user_email: str =
 {conversation_context}
 
 Return ONLY the question text - no greetings, no introductions, just the question."""
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return category, messages
+
+
+def prompt_chars(messages: List[Dict[str, str]]) -> int:
+    return sum(len(message["content"]) for message in messages)
+
+
+def record_usage(current, response):
+    """Copy the token counts the API reports onto a span"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        current.set(
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            total_tokens=getattr(usage, "total_tokens", None)
+        )
+
+
+async def generate_pooled_questions(chat_history: List[Dict[str, str]], count: int) -> List[str]:
+    """Generate several candidate questions in one request to stock the question pool"""
+    _, messages = build_question_prompt(chat_history)
+    with span("openai.chat", model="gpt-4o-mini", n=min(count, 10), prompt_chars=prompt_chars(messages)) as current:
+        async with openai_slot():
+            response = await get_openai().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=1.0,  # A little hotter than live questions so the choices differ
+                max_tokens=150,
+                n=min(count, 10),
+                timeout=OPENAI_CHAT_TIMEOUT
+            )
+        record_usage(current, response)
+    return [clean_question(choice.message.content or "") for choice in response.choices]
+
+
+# The opening question has no user context, so it can be generated ahead of time
+question_pool.register(0, lambda count: generate_pooled_questions([], count))
+
+question_latency = LatencyTracker("next_question")
+stream_first_token_latency = LatencyTracker("next_question_stream_first_token")
+
+
+async def request_question(messages: List[Dict[str, str]], admitted: Optional[Callable[[], None]] = None) -> str:
+    # Call OpenAI API
+    with span("openai.chat", model="gpt-4o-mini", prompt_chars=prompt_chars(messages)) as current:
+        async with openai_slot():
+            if admitted:
+                admitted()
+            response = await get_openai().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.8,
+                max_tokens=150,
+                timeout=OPENAI_CHAT_TIMEOUT
+            )
+        record_usage(current, response)
+    
+    question = clean_question(response.choices[0].message.content or "")
+    if not question:
+        raise ValueError("Empty response from LLM")
+    return question
+
+
+async def generate_next_question(
+    chat_history: List[Dict[str, str]],
+    user_email: str = None,
+    session=None
+) -> Dict:
+    current_count = len(chat_history)
+    
+    # Determine if questionnaire is complete
+    if current_count >= 10:
+        return await complete_questionnaire(chat_history, user_email)
+    
+    # A pooled question needs no prompt, so only build one on a miss
+    pooled_question = question_pool.take(current_count)
+    if pooled_question:
+        return {
+            "question": pooled_question,
+            "is_complete": False,
+            "question_number": current_count + 1,
+            "total_questions": 10,
+            "category": question_category(current_count)[0]
+        }
+    
+    category, messages = build_question_prompt(chat_history, session)
     
     try:
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.8,
-            max_tokens=150
+        # Bounded by the latency budget, with a hedged retry once the first attempt passes p95
+        question = await call_with_budget(
+            lambda admitted: request_question(messages, admitted),
+            tracker=question_latency,
+            hedge_after=question_latency.hedge_delay(),
+            can_hedge=openai_guard.has_free_slot
         )
         
-        question = response.choices[0].message.content.strip()
-        
-        # Remove quotes if LLM added them
-        if question.startswith('"') and question.endswith('"'):
-            question = question[1:-1]
-        if question.startswith("'") and question.endswith("'"):
-            question = question[1:-1]
-        
         return {
             "question": question,
             "is_complete": False,
@@ -191,25 +389,103 @@ Return ONLY the question text - no greetings, no introductions, just the questio
         }
     
     except Exception as e:
-        # Fallback questions if LLM fails
-        fallback_questions = {
-            0: "What are the most important values you look for in a partner?",
-            1: "How would your closest friends describe your personality?",
-            2: "What does your ideal relationship look like?",
-            3: "How do you typically handle disagreements or conflicts?",
-            4: "What are your long-term goals in life and love?",
-            5: "How do you like to spend your free time?",
-            6: "Are you more of an introvert, extrovert, or somewhere in between?",
-            7: "What kind of activities energize you the most?",
-            8: "Describe your perfect weekend.",
-            9: "What hobbies or interests are you passionate about?"
-        }
-        
-        return {
-            "question": fallback_questions.get(current_count, "Tell me more about yourself."),
+        return fallback_response(current_count, category)
+
+
+async def stream_next_question(
+    chat_history: List[Dict[str, str]],
+    user_email: str = None,
+    session=None
+):
+    """
+    Streaming variant of generate_next_question.
+    Yields ("token", {"text": ...}) events as the model produces them, then a single
+    ("done", response) event with the same dict generate_next_question returns.
+    The question in the final event is authoritative: it is cleaned of quotes and,
+    if the LLM fails mid-stream, replaced by the fallback question.
+    """
+    current_count = len(chat_history)
+    
+    if current_count >= 10:
+        yield "done", await complete_questionnaire(chat_history, user_email)
+        return
+    
+    pooled_question = question_pool.take(current_count)
+    if pooled_question:
+        yield "token", {"text": pooled_question}
+        yield "done", {
+            "question": pooled_question,
             "is_complete": False,
             "question_number": current_count + 1,
             "total_questions": 10,
-            "category": category,
-            "note": "Using fallback question due to LLM error"
-        }
\ No newline at end of file
+            "category": question_category(current_count)[0]
+        }
+        return
+    
+    category, messages = build_question_prompt(chat_history, session)
+    
+    # Every step, including waiting for a slot, must fit in the latency budget
+    started = time.perf_counter()
+
+    def remaining():
+        left = QUESTION_DEADLINE_SECONDS - (time.perf_counter() - started)
+        if left <= 0:
+            raise DeadlineExceeded(f"next_question_stream exceeded {QUESTION_DEADLINE_SECONDS}s budget")
+        return left
+
+    parts = []
+    # Not made the current span: the generator suspends at every token
+    stream_span = start_span("openai.chat.stream", model="gpt-4o-mini", prompt_chars=prompt_chars(messages))
+    try:
+        async with openai_slot(timeout=remaining()):
+            stream = await asyncio.wait_for(
+                get_openai().chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.8,
+                    max_tokens=150,
+                    timeout=OPENAI_CHAT_TIMEOUT,
+                    stream=True,
+                    stream_options={"include_usage": True}  # Token counts arrive in a final chunk
+                ),
+                remaining()
+            )
+            chunks = stream.__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                    except StopAsyncIteration:
+                        break
+                    if not chunk.choices:
+                        record_usage(stream_span, chunk)
+                        continue
+                    text = chunk.choices[0].delta.content
+                    if text:
+                        if not parts:
+                            stream_first_token_latency.record(time.perf_counter() - started)
+                            stream_span.set(first_token_ms=round((time.perf_counter() - started) * 1000, 1))
+                        parts.append(text)
+                        yield "token", {"text": text}
+            finally:
+                await stream.close()
+        
+        question = clean_question("".join(parts))
+        if not question:
+            raise ValueError("Empty response from LLM")
+    
+    except Exception as e:
+        stream_span.fail(e)
+        yield "done", fallback_response(current_count, category)
+        return
+    finally:
+        stream_span.set(response_chars=sum(len(part) for part in parts))
+        stream_span.finish()
+    
+    yield "done", {
+        "question": question,
+        "is_complete": False,
+        "question_number": current_count + 1,
+        "total_questions": 10,
+        "category": category
+    }
@@ -0,0 +1,218 @@
+"""
+Minimal in-process metrics: counters, gauges and bucketed histograms with
+labels, collected in a global registry and rendered in the Prometheus text
+format for the /metrics endpoint.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import bisect
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Compute values at collection time. `callback` returns {label values tuple: value}"""
+        self._callback = callback
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        if self._callback:
+            values = self._callback()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [(self.name, key, value) for key, value in values.items()]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series[2] if series else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate a quantile by interpolating inside the bucket that contains it"""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if not series or not series[2]:
+            return None
+
+        rank = q * series[2]
+        seen = 0
+        for index, bucket_count in enumerate(series[0]):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def samples(self):
+        """Cumulative bucket samples in Prometheus layout"""
+        result = []
+        with self._lock:
+            series_items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._series.items()]
+        for key, (counts, total, count) in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                result.append((f"{self.name}_bucket", key + (le,), cumulative))
+            result.append((f"{self.name}_sum", key, total))
+            result.append((f"{self.name}_count", key, count))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self) -> List[object]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in sorted(self.metrics(), key=lambda m: m.name):
+            help_text = metric.help.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {metric.name} {help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A failing gauge callback shouldn't take the whole page down
+                samples = []
+            for name, key, value in samples:
+                # Histogram bucket samples carry an extra "le" label value
+                labelnames = metric.labelnames + (("le",) if len(key) > len(metric.labelnames) else ())
+                labels = ",".join(
+                    f'{label}="{_escape(str(label_value))}"'
+                    for label, label_value in zip(labelnames, key)
+                )
+                lines.append(f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Global registry instance
+registry = MetricsRegistry()
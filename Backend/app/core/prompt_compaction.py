@@ -0,0 +1,191 @@
+"""
+Compaction of the questionnaire conversation context.
+The last PROMPT_RECENT_TURNS Q&A pairs are sent verbatim; older turns are
+reduced to a few key phrases each. If the result is still over
+PROMPT_CONTEXT_TOKEN_BUDGET, older summaries lose phrases, then lines, then
+recent turns are trimmed down to one.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from app.core.metrics import registry
+import logging
+import re
+import os
+
+logger = logging.getLogger(__name__)
+
+PROMPT_COMPACTION_ENABLED = os.getenv("PROMPT_COMPACTION_ENABLED", "true").lower() == "true"
+PROMPT_RECENT_TURNS = int(os.getenv("PROMPT_RECENT_TURNS", "3"))
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "300"))
+PROMPT_KEY_PHRASES = int(os.getenv("PROMPT_KEY_PHRASES", "4"))
+# gpt-4o-mini input price, used only for the savings report
+PROMPT_INPUT_COST_PER_MILLION = float(os.getenv("PROMPT_INPUT_COST_PER_MILLION", "0.15"))
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing dont down during each even ever
+few for from further get got had has have having he her here hers herself him himself
+his how i id if im in into is it its itself ive just kind like lot lots me more most
+much my myself no nor not now of off on once only or other our ours out over own pretty
+quite really same she should so some such than that thats the their theirs them then
+there these they thing things this those through to too under until up us very was we
+were what whats when where which while who whom why will with would yeah yes you your
+yours yourself
+""".split())
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+FULL_CONTEXT_HEADER = "Previous conversation:\n"
+WORD_PATTERN = re.compile(r"[A-Za-z0-9']+|[.,;:!?()\n]")
+
+prompt_context_tokens = registry.counter(
+    "prompt_context_tokens_total",
+    "Conversation context tokens, before (full) and after (sent) compaction",
+    ("kind",)
+)
+questionnaire_prompt_tokens_saved = registry.histogram(
+    "questionnaire_prompt_tokens_saved",
+    "Context tokens saved by compaction over one whole questionnaire",
+    buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000)
+)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate BPE token count: one token per word piece or punctuation mark"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+HEADER_TOKENS = count_tokens(FULL_CONTEXT_HEADER)
+
+
+@lru_cache(maxsize=4096)
+def key_phrases(text: str, limit: int = PROMPT_KEY_PHRASES) -> Tuple[str, ...]:
+    """Runs of content words, longest first, in their original order"""
+    phrases, current = [], []
+    for word in WORD_PATTERN.findall(text):
+        lowered = word.lower().replace("'", "")
+        if lowered in STOPWORDS or not word[0].isalnum():
+            if current:
+                phrases.append(" ".join(current))
+                current = []
+            continue
+        current.append(word.lower())
+    if current:
+        phrases.append(" ".join(current))
+
+    unique = list(dict.fromkeys(phrases))
+    keep = set(sorted(unique, key=lambda phrase: len(phrase.split()), reverse=True)[:limit])
+    return tuple(phrase for phrase in unique if phrase in keep)
+
+
+def format_turns(chat_history: List[Dict[str, str]], start: int = 1) -> str:
+    return "".join(
+        f"Q{i}: {entry.get('q', '')}\nA{i}: {entry.get('a', '')}\n\n"
+        for i, entry in enumerate(chat_history, start)
+    )
+
+
+def full_context(chat_history: List[Dict[str, str]]) -> str:
+    if not chat_history:
+        return ""
+    return FULL_CONTEXT_HEADER + format_turns(chat_history)
+
+
+def full_context_tokens(chat_history: List[Dict[str, str]]) -> int:
+    return count_tokens(full_context(chat_history))
+
+
+def turn_tokens(number: int, entry: Dict[str, str]) -> int:
+    """
+    Tokens turn `number` adds to full_context(). Turns are separated by whitespace,
+    so a session can keep the total up to date one turn at a time.
+    """
+    return count_tokens(format_turns([entry], number)) + (HEADER_TOKENS if number == 1 else 0)
+
+
+def summary_line(number: int, entry: Dict[str, str], limit: int = PROMPT_KEY_PHRASES) -> str:
+    """Key-phrase line standing in for an older turn"""
+    topic = ", ".join(key_phrases(entry.get("q", ""), 2)) or "question"
+    answer = ", ".join(key_phrases(entry.get("a", ""), limit)) or "-"
+    return f"- Q{number} ({topic}): {answer}\n"
+
+
+def _render(
+    chat_history: List[Dict[str, str]],
+    recent: int,
+    limit: int,
+    drop: int,
+    summaries: Optional[List[str]] = None
+) -> str:
+    older = chat_history[:len(chat_history) - recent]
+    if summaries is not None and limit == PROMPT_KEY_PHRASES and len(summaries) == len(older):
+        lines = summaries[drop:]
+    else:
+        lines = [summary_line(i, entry, limit) for i, entry in enumerate(older, 1)][drop:]
+
+    context = ""
+    if lines:
+        context += "Earlier answers (key points):\n" + "".join(lines) + "\n"
+    context += "Recent conversation:\n" + format_turns(chat_history[len(older):], len(older) + 1)
+    return context
+
+
+def compact_context(
+    chat_history: List[Dict[str, str]],
+    budget: int = PROMPT_CONTEXT_TOKEN_BUDGET,
+    recent_turns: int = PROMPT_RECENT_TURNS,
+    summaries: Optional[List[str]] = None
+) -> str:
+    """
+    Conversation context for the question prompt, kept under `budget` tokens where possible.
+    `summaries` are precomputed summary_line()s for the turns before the recent ones,
+    so a session only has to summarize each turn once.
+    """
+    if not chat_history:
+        return ""
+    if not PROMPT_COMPACTION_ENABLED:
+        return full_context(chat_history)
+    if len(chat_history) <= recent_turns:
+        context = full_context(chat_history)
+        if count_tokens(context) <= budget:
+            return context
+
+    recent = min(recent_turns, len(chat_history))
+    older_count = len(chat_history) - recent
+    context = _render(chat_history, recent, PROMPT_KEY_PHRASES, 0, summaries)
+
+    # Shrink the summaries, then drop the oldest, then fall back to fewer verbatim turns
+    limit, drop = PROMPT_KEY_PHRASES, 0
+    while count_tokens(context) > budget:
+        if limit > 1:
+            limit -= 1
+        elif drop < older_count:
+            drop += 1
+        elif recent > 1:
+            recent -= 1
+            older_count += 1
+            limit, drop = 1, older_count
+        else:
+            break
+        context = _render(chat_history, recent, limit, drop, summaries)
+    return context
+
+
+def record_context_tokens(full_tokens: int, context: str) -> int:
+    """Count one prompt's context, given the tokens the uncompacted history would have used. Returns the tokens sent"""
+    sent_tokens = count_tokens(context)
+    prompt_context_tokens.inc(full_tokens, kind="full")
+    prompt_context_tokens.inc(sent_tokens, kind="sent")
+    return sent_tokens
+
+
+def record_questionnaire_savings(full_tokens: int, sent_tokens: int) -> Dict:
+    """Record the context tokens one whole questionnaire would have used and actually sent"""
+    saved = full_tokens - sent_tokens
+    cost_saved = saved * PROMPT_INPUT_COST_PER_MILLION / 1_000_000
+    questionnaire_prompt_tokens_saved.observe(saved)
+    logger.info(
+        "Prompt compaction: %d context tokens sent instead of %d (%d saved, $%.6f)",
+        sent_tokens, full_tokens, saved, cost_saved
+    )
+    return {"full_tokens": full_tokens, "sent_tokens": sent_tokens, "tokens_saved": saved, "cost_saved_usd": cost_saved}
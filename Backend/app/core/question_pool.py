@@ -0,0 +1,147 @@
+"""
+Pool of pre-generated questions for slots whose prompt has no user context
+(currently the opening question). Questions are served instantly from an
+in-memory buffer, refilled in the background when a slot drops below its
+low-water mark, and saved to disk so the pool survives restarts.
+"""
+
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+QUESTION_POOL_PATH = os.getenv("QUESTION_POOL_PATH", "question_pool.json")
+QUESTION_POOL_TARGET = int(os.getenv("QUESTION_POOL_TARGET", "50"))
+QUESTION_POOL_LOW_WATER = int(os.getenv("QUESTION_POOL_LOW_WATER", "15"))
+
+INTRO_PREFIXES = ("sure", "here", "great", "okay", "ok,", "question:")
+
+
+def is_valid_question(text: str, max_words: int = 20) -> bool:
+    """Reject empty, multi-line, overlong or chatty LLM output"""
+    if not text or "\n" in text:
+        return False
+    if not text.endswith("?"):
+        return False
+    if len(text.split()) > max_words:
+        return False
+    return not text.lower().startswith(INTRO_PREFIXES)
+
+
+class QuestionPool:
+    """Buffers of validated questions per context-free slot"""
+
+    def __init__(
+        self,
+        path: Optional[str] = QUESTION_POOL_PATH,
+        target: int = QUESTION_POOL_TARGET,
+        low_water: int = QUESTION_POOL_LOW_WATER
+    ):
+        self.path = path
+        self.target = target
+        self.low_water = low_water
+        self._buffers: Dict[int, deque] = {}
+        self._generators: Dict[int, Callable[[int], Awaitable[List[str]]]] = {}
+        self._refills: Dict[int, asyncio.Task] = {}
+
+    def register(self, slot: int, generator: Callable[[int], Awaitable[List[str]]]):
+        """
+        Register a context-free slot (question number, 0-based).
+        `generator(count)` returns up to `count` freshly generated questions.
+        """
+        self._generators[slot] = generator
+        self._buffers.setdefault(slot, deque())
+
+    def size(self, slot: int) -> int:
+        return len(self._buffers.get(slot, ()))
+
+    def take(self, slot: int) -> Optional[str]:
+        """Pop a question for the slot, or None if the slot is empty or not pooled"""
+        buffer = self._buffers.get(slot)
+        if buffer is None:
+            return None
+
+        question = buffer.popleft() if buffer else None
+        if len(buffer) < self.low_water:
+            self._schedule_refill(slot)
+        return question
+
+    def _schedule_refill(self, slot: int):
+        if slot in self._refills or slot not in self._generators:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._refill(slot))
+        except RuntimeError:
+            return  # No event loop (e.g. called from a script), refill on next start
+        self._refills[slot] = task
+        task.add_done_callback(lambda _: self._refills.pop(slot, None))
+
+    async def _refill(self, slot: int):
+        buffer = self._buffers[slot]
+        attempts = 0
+        # Bounded so a model that keeps failing validation can't loop forever
+        while len(buffer) < self.target and attempts < 5:
+            attempts += 1
+            try:
+                questions = await self._generators[slot](self.target - len(buffer))
+            except Exception as e:
+                logger.warning(f"Question pool refill for slot {slot} failed: {e}")
+                return
+
+            existing = set(buffer)
+            for question in questions:
+                if is_valid_question(question) and question not in existing:
+                    buffer.append(question)
+                    existing.add(question)
+
+        await self.save()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load question pool from {self.path}: {e}")
+            return
+
+        for slot, questions in data.items():
+            buffer = self._buffers.setdefault(int(slot), deque())
+            buffer.extend(q for q in questions if is_valid_question(q) and q not in buffer)
+
+    def _write(self, data: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)  # Atomic, so a crash never leaves a half-written pool
+
+    async def save(self):
+        if not self.path:
+            return
+        data = {str(slot): list(buffer) for slot, buffer in self._buffers.items()}
+        try:
+            await asyncio.to_thread(self._write, data)
+        except Exception as e:
+            logger.warning(f"Could not save question pool to {self.path}: {e}")
+
+    async def start(self):
+        """Load the saved pool and top up any slot below its low-water mark"""
+        self.load()
+        for slot in self._generators:
+            if self.size(slot) < self.low_water:
+                self._schedule_refill(slot)
+
+    async def stop(self):
+        for task in list(self._refills.values()):
+            task.cancel()
+        await asyncio.gather(*self._refills.values(), return_exceptions=True)
+        await self.save()
+
+
+# Global pool instance
+question_pool = QuestionPool()
@@ -0,0 +1,218 @@
+"""
+Server-side questionnaire sessions.
+Each user's chat is kept in memory (bounded LRU) and written through to the
+questionnaire_sessions table, so clients can send one answer per turn,
+resume an interrupted questionnaire, and the transcript stays available for
+re-embedding. The prompt context is built incrementally: each turn is
+summarized once, when it moves out of the verbatim recent window, and the
+summary line is appended to the session. Token counts for the compaction
+metrics are kept the same way: each turn is counted once, when it is added.
+
+The database row is authoritative: every row carries a version, a turn is
+built on a copy of the session, and save() only writes if the version is
+still the one the turn started from. The LRU just saves rebuilding a session
+whose version hasn't changed, so workers in other processes can't overwrite
+each other's turns.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, List, Optional, Tuple
+from app.core.prompt_compaction import (
+    compact_context,
+    summary_line,
+    turn_tokens,
+    full_context_tokens,
+    record_context_tokens,
+    PROMPT_RECENT_TURNS
+)
+from app.db.database import async_session, has_database
+from app.models.questionnaire_session import QuestionnaireSession
+import weakref
+import asyncio
+import os
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "5000"))
+
+
+class NoPendingQuestion(Exception):
+    """An answer arrived while no question was waiting for one"""
+
+
+class SessionConflict(Exception):
+    """The stored session changed since the turn read it (e.g. a turn handled by another worker)"""
+
+
+@dataclass
+class ChatSession:
+    user_email: str
+    chat_history: List[Dict[str, str]] = field(default_factory=list)
+    pending_question: Optional[str] = None
+    completed: bool = False
+    version: int = 0  # Version of the stored row this session was read from; 0 if there is none
+    summaries: List[str] = field(default_factory=list)  # Key-phrase lines for turns before the recent window
+    history_tokens: Optional[int] = None  # Tokens of the uncompacted history, kept up to date per turn
+    # Context tokens over the prompts built for this questionnaire, uncompacted vs sent
+    context_tokens_full: int = 0
+    context_tokens_sent: int = 0
+
+    def __post_init__(self):
+        if not self.summaries:
+            self._summarize_closed_turns()
+        if self.history_tokens is None:
+            self.history_tokens = full_context_tokens(self.chat_history)
+
+    def _summarize_closed_turns(self):
+        """Summarize the turns that have left the recent window and aren't summarized yet"""
+        older_count = len(self.chat_history) - PROMPT_RECENT_TURNS
+        for number in range(len(self.summaries) + 1, older_count + 1):
+            self.summaries.append(summary_line(number, self.chat_history[number - 1]))
+
+    def copy(self) -> "ChatSession":
+        """Working copy for one turn, so a failed turn leaves the shared session untouched"""
+        return ChatSession(
+            user_email=self.user_email,
+            chat_history=list(self.chat_history),
+            pending_question=self.pending_question,
+            completed=self.completed,
+            version=self.version,
+            summaries=list(self.summaries),
+            history_tokens=self.history_tokens,
+            context_tokens_full=self.context_tokens_full,
+            context_tokens_sent=self.context_tokens_sent
+        )
+
+    def append_answer(self, answer: str):
+        """Record the answer to the pending question"""
+        if self.pending_question is None:
+            raise NoPendingQuestion(f"No question is waiting for an answer from {self.user_email}")
+        entry = {"q": self.pending_question, "a": answer}
+        self.chat_history.append(entry)
+        self.pending_question = None
+        self._summarize_closed_turns()
+        self.history_tokens += turn_tokens(len(self.chat_history), entry)
+
+    def reset(self, chat_history: List[Dict[str, str]]):
+        """Replace the session with a full history sent by the client"""
+        self.chat_history = [dict(entry) for entry in chat_history]
+        self.pending_question = None
+        self.completed = False
+        self.summaries = []
+        self._summarize_closed_turns()
+        self.history_tokens = full_context_tokens(self.chat_history)
+        if not self.chat_history:
+            self.context_tokens_full = self.context_tokens_sent = 0
+
+    def prompt_context(self) -> str:
+        """Compacted context for the next question's prompt; its tokens are added to the metrics"""
+        context = compact_context(self.chat_history, summaries=self.summaries)
+        self.context_tokens_full += self.history_tokens
+        self.context_tokens_sent += record_context_tokens(self.history_tokens, context)
+        return context
+
+    def take_token_totals(self) -> Tuple[int, int]:
+        """(full, sent) context tokens for the questionnaire so far, reset so they are reported once"""
+        totals = self.context_tokens_full, self.context_tokens_sent
+        self.context_tokens_full = self.context_tokens_sent = 0
+        return totals
+
+
+class QuestionnaireSessionStore:
+    """In-memory LRU of chat sessions, persisted to Postgres when a database is configured"""
+
+    def __init__(self, max_sessions: int = SESSION_CACHE_SIZE):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._locks = weakref.WeakValueDictionary()
+
+    def lock(self, user_email: str) -> asyncio.Lock:
+        """Per-user lock so concurrent turns for the same user don't interleave"""
+        lock = self._locks.get(user_email)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_email] = lock
+        return lock
+
+    def _remember(self, session: ChatSession):
+        self._sessions[session.user_email] = session
+        self._sessions.move_to_end(session.user_email)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def get(self, user_email: str) -> ChatSession:
+        """Return the user's session as currently stored, or a new empty one. Don't modify it; use copy()"""
+        cached = self._sessions.get(user_email)
+        if not has_database():
+            session = cached or ChatSession(user_email=user_email)
+            self._remember(session)
+            return session
+
+        async with async_session() as db:
+            result = await db.execute(
+                select(QuestionnaireSession.version).where(QuestionnaireSession.user_email == user_email)
+            )
+            version = result.scalar()
+            if version is None:
+                session = ChatSession(user_email=user_email)
+            elif cached is not None and cached.version == version:
+                session = cached
+            else:
+                result = await db.execute(
+                    select(QuestionnaireSession).where(QuestionnaireSession.user_email == user_email)
+                )
+                row = result.scalars().one()
+                session = ChatSession(user_email=user_email)
+                session.reset(row.chat_history or [])
+                session.pending_question = row.pending_question
+                session.completed = bool(row.completed)
+                session.version = row.version
+
+        self._remember(session)
+        return session
+
+    async def save(self, session: ChatSession):
+        """
+        Store a turn's working copy. Raises SessionConflict if the row changed since the
+        copy was read, in which case nothing is written.
+        """
+        if not has_database():
+            self._remember(session)
+            return
+
+        values = {
+            "chat_history": session.chat_history,
+            "pending_question": session.pending_question,
+            "completed": session.completed
+        }
+        try:
+            async with async_session() as db:
+                if session.version == 0:
+                    db.add(QuestionnaireSession(user_email=session.user_email, version=1, **values))
+                else:
+                    result = await db.execute(
+                        update(QuestionnaireSession)
+                        .where(
+                            QuestionnaireSession.user_email == session.user_email,
+                            QuestionnaireSession.version == session.version
+                        )
+                        .values(version=QuestionnaireSession.version + 1, **values)
+                    )
+                    if result.rowcount != 1:
+                        raise SessionConflict(f"Questionnaire session for {session.user_email} changed")
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # Another worker created the row first
+                    raise SessionConflict(f"Questionnaire session for {session.user_email} changed")
+        except SessionConflict:
+            self._sessions.pop(session.user_email, None)
+            raise
+
+        session.version += 1
+        self._remember(session)
+
+
+# Global session store instance
+questionnaire_sessions = QuestionnaireSessionStore()
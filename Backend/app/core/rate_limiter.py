@@ -1,35 +1,339 @@
 """
 Rate limiting for API endpoints to prevent abuse.
-Uses in-memory storage with time-based cleanup.
+Sliding-window counter: each key keeps only the request counts of the current
+and previous fixed windows, and the previous count is weighted by how much of
+it still overlaps the sliding window.
+
+Where the counts live is pluggable via RATE_LIMIT_BACKEND:
+- memory: per process, spread over independently locked stripes (default)
+- sqlite: a WAL-mode SQLite file shared by every worker on the host
+- redis:  any Redis-protocol server, shared across hosts
+Idle keys are evicted by a background sweeper (memory, sqlite) or by key
+expiry (redis).
+
+Request handlers use `await rate_limiter.check(...)`: the sqlite and redis
+backends do blocking I/O, so their checks run in a worker thread instead of
+on the event loop.
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+from app.utils.resp_client import RespClient, RespError
 import threading
+import asyncio
+import logging
+import sqlite3
+import math
+import re
+import time
+import os
 
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_STRIPES = int(os.getenv("RATE_LIMIT_STRIPES", "64"))
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "60"))
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "rate_limits.sqlite3")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.5"))
+RATE_LIMIT_REDIS_PREFIX = os.getenv("RATE_LIMIT_REDIS_PREFIX", "ratelimit:")
+# Keys fetched per SCAN call in the Redis backend's clear_all() and size()
+RATE_LIMIT_REDIS_SCAN_COUNT = int(os.getenv("RATE_LIMIT_REDIS_SCAN_COUNT", "500"))
+
+
+def window_position(now: float, window_seconds: int) -> Tuple[int, float]:
+    """Index of the fixed window containing `now`, and seconds elapsed within it"""
+    window_index = int(now // window_seconds)
+    return window_index, now - window_index * window_seconds
+
+
+def estimate(previous: int, current: int, elapsed: float, window_seconds: int) -> float:
+    return previous * (1 - elapsed / window_seconds) + current
+
+
+def seconds_until_allowed(previous: int, current: int, max_requests: int, elapsed: float, window_seconds: int) -> int:
+    """Time until the weighted count leaves room for one more request"""
+    room = max_requests - 1
+    if current <= room:
+        # The previous window's share decays within the current window
+        wait = 0.0 if previous == 0 else window_seconds * (1 - (room - current) / previous) - elapsed
+    else:
+        # Wait for the next window, then for this window's count to decay as "previous"
+        wait = (window_seconds - elapsed) + window_seconds * (1 - room / current)
+    return max(1, math.ceil(wait))
+
+
+class _WindowState:
+    __slots__ = ("window_seconds", "window_index", "current", "previous")
+
+    def __init__(self, window_seconds: int, window_index: int):
+        self.window_seconds = window_seconds
+        self.window_index = window_index
+        self.current = 0
+        self.previous = 0
+
+    def advance(self, window_index: int):
+        if window_index == self.window_index:
+            return
+        self.previous = self.current if window_index == self.window_index + 1 else 0
+        self.current = 0
+        self.window_index = window_index
+
+    def idle(self, now: float) -> bool:
+        # Nothing left in the sliding window once the previous window is fully behind it
+        return int(now // self.window_seconds) > self.window_index + 1
+
+
+class _Stripe:
+    __slots__ = ("lock", "keys")
 
-class RateLimiter:
-    """Simple in-memory rate limiter"""
-    
     def __init__(self):
-        self._requests: Dict[str, list] = {}
-        self._lock = threading.Lock()
-    
-    def _cleanup_old_requests(self, key: str, window_seconds: int):
-        """Remove requests older than the time window"""
-        if key not in self._requests:
+        self.lock = threading.Lock()
+        self.keys: Dict[str, _WindowState] = {}
+
+
+class MemoryBackend:
+    """Counts in this process only, with lock striping"""
+
+    blocking = False
+
+    def __init__(self, stripes: int = RATE_LIMIT_STRIPES):
+        self._stripes = [_Stripe() for _ in range(stripes)]
+
+    def _stripe(self, key: str) -> _Stripe:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def hit(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, Optional[int]]:
+        window_index, elapsed = window_position(now, window_seconds)
+        stripe = self._stripe(key)
+
+        with stripe.lock:
+            state = stripe.keys.get(key)
+            if state is None or state.window_seconds != window_seconds:
+                state = stripe.keys[key] = _WindowState(window_seconds, window_index)
+            state.advance(window_index)
+
+            if estimate(state.previous, state.current, elapsed, window_seconds) + 1 > max_requests:
+                return True, seconds_until_allowed(
+                    state.previous, state.current, max_requests, elapsed, window_seconds
+                )
+
+            state.current += 1
+            return False, None
+
+    def sweep(self, now: float) -> int:
+        """Evict idle keys, one stripe at a time. Returns the number of keys removed"""
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                idle_keys = [key for key, state in stripe.keys.items() if state.idle(now)]
+                for key in idle_keys:
+                    del stripe.keys[key]
+            removed += len(idle_keys)
+        return removed
+
+    def reset(self, key: str):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.keys.pop(key, None)
+
+    def clear_all(self):
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.keys.clear()
+
+    def size(self) -> int:
+        return sum(len(stripe.keys) for stripe in self._stripes)
+
+
+class SQLiteBackend:
+    """Counts in a WAL-mode SQLite file, shared by all worker processes on the host"""
+
+    blocking = True
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT NOT NULL, window_seconds INTEGER NOT NULL, window_index INTEGER NOT NULL, "
+                "current INTEGER NOT NULL, previous INTEGER NOT NULL, "
+                "PRIMARY KEY (key, window_seconds))"
+            )
+            self._local.db = db
+        return db
+
+    def hit(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, Optional[int]]:
+        window_index, elapsed = window_position(now, window_seconds)
+        db = self._connection()
+
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT window_index, current, previous FROM rate_limits WHERE key = ? AND window_seconds = ?",
+                (key, window_seconds)
+            ).fetchone()
+
+            state = _WindowState(window_seconds, window_index)
+            if row:
+                state.window_index, state.current, state.previous = row
+                state.advance(window_index)
+
+            if estimate(state.previous, state.current, elapsed, window_seconds) + 1 > max_requests:
+                result = True, seconds_until_allowed(
+                    state.previous, state.current, max_requests, elapsed, window_seconds
+                )
+            else:
+                state.current += 1
+                result = False, None
+
+            db.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_seconds, window_index, current, previous) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, window_seconds, state.window_index, state.current, state.previous)
+            )
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def sweep(self, now: float) -> int:
+        cursor = self._connection().execute(
+            "DELETE FROM rate_limits WHERE (window_index + 2) * window_seconds <= ?", (now,)
+        )
+        return cursor.rowcount
+
+    def reset(self, key: str):
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def clear_all(self):
+        self._connection().execute("DELETE FROM rate_limits")
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+class RedisBackend:
+    """
+    Counts in a Redis-protocol server: one counter per key and window, expiring
+    after two windows. INCR, EXPIRE and GET of the previous window go out in a
+    single pipeline; a rejected request is taken back with DECR.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, timeout: float = RATE_LIMIT_REDIS_TIMEOUT,
+                 prefix: str = RATE_LIMIT_REDIS_PREFIX):
+        self.client = RespClient(url, timeout=timeout)
+        self.prefix = prefix
+        self._window_sizes = set()
+
+    def _key(self, key: str, window_seconds: int, window_index: int) -> str:
+        return f"{self.prefix}{key}:{window_seconds}:{window_index}"
+
+    def hit(self, key: str, max_requests: int, window_seconds: int, now: float) -> Tuple[bool, Optional[int]]:
+        window_index, elapsed = window_position(now, window_seconds)
+        self._window_sizes.add(window_seconds)
+        current_key = self._key(key, window_seconds, window_index)
+
+        replies = self.client.pipeline(
+            ("INCR", current_key),
+            ("EXPIRE", current_key, window_seconds * 2),
+            ("GET", self._key(key, window_seconds, window_index - 1))
+        )
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        current, previous = replies[0], int(replies[2] or 0)
+
+        # `current` already counts this request
+        if estimate(previous, current, elapsed, window_seconds) > max_requests:
+            self.client.execute("DECR", current_key)
+            return True, seconds_until_allowed(previous, current - 1, max_requests, elapsed, window_seconds)
+        return False, None
+
+    def sweep(self, now: float) -> int:
+        # Keys expire on the server
+        return 0
+
+    def reset(self, key: str):
+        now = time.time()
+        keys = []
+        for window_seconds in self._window_sizes:
+            window_index, _ = window_position(now, window_seconds)
+            keys += [self._key(key, window_seconds, window_index), self._key(key, window_seconds, window_index - 1)]
+        if keys:
+            self.client.execute("DEL", *keys)
+
+    def _scan(self):
+        """Batches of this limiter's keys, via SCAN MATCH <prefix>*"""
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", self.prefix) + "*"
+        cursor = 0
+        while True:
+            cursor, keys = self.client.execute("SCAN", cursor, "MATCH", pattern, "COUNT", RATE_LIMIT_REDIS_SCAN_COUNT)
+            cursor = int(cursor)
+            if keys:
+                yield keys
+            if cursor == 0:
+                return
+
+    def clear_all(self):
+        for keys in self._scan():
+            self.client.execute("DEL", *keys)
+
+    def size(self) -> int:
+        """Number of live window counters (up to two per key and window size)"""
+        return sum(len(keys) for keys in self._scan())
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {name}")
+
+
+class RateLimiter:
+    """Sliding-window rate limiter over a pluggable counter backend"""
+
+    def __init__(self, backend=None, sweep_interval: float = RATE_LIMIT_SWEEP_INTERVAL):
+        self.backend = backend if backend is not None else create_backend()
+        self._sweep_interval = sweep_interval
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None or self._sweep_interval <= 0:
             return
-        
-        cutoff_time = datetime.now() - timedelta(seconds=window_seconds)
-        self._requests[key] = [
-            req_time for req_time in self._requests[key]
-            if req_time > cutoff_time
-        ]
-        
-        # Remove key if no requests remain
-        if not self._requests[key]:
-            del self._requests[key]
-    
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="rate-limit-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stopped.wait(self._sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Rate limit sweep failed: %s", e)
+
+    def sweep(self) -> int:
+        """Evict idle keys. Returns the number of keys removed"""
+        return self.backend.sweep(time.time())
+
     def is_rate_limited(
         self,
         key: str,
@@ -38,46 +342,44 @@ class RateLimiter:
     ) -> tuple[bool, Optional[int]]:
         """
         Check if key has exceeded rate limit.
-        
+
         Args:
             key: Identifier (e.g., user email or IP)
             max_requests: Maximum requests allowed in window
             window_seconds: Time window in seconds
-        
+
         Returns:
             (is_limited, seconds_until_reset)
         """
-        with self._lock:
-            # Clean up old requests
-            self._cleanup_old_requests(key, window_seconds)
-            
-            # Initialize if new key
-            if key not in self._requests:
-                self._requests[key] = []
-            
-            # Check if limit exceeded
-            if len(self._requests[key]) >= max_requests:
-                # Calculate time until oldest request expires
-                oldest_request = min(self._requests[key])
-                time_until_reset = (
-                    oldest_request + timedelta(seconds=window_seconds) - datetime.now()
-                ).total_seconds()
-                return True, int(time_until_reset) + 1
-            
-            # Add new request
-            self._requests[key].append(datetime.now())
+        self._ensure_sweeper()
+        try:
+            # Wall-clock time so every process agrees on window boundaries
+            return self.backend.hit(key, max_requests, window_seconds, time.time())
+        except (OSError, ConnectionError, RespError, sqlite3.Error) as e:
+            # Fail open: an unavailable limiter store shouldn't take the API down
+            logger.warning("Rate limit check failed for %s, allowing request: %s", key, e)
             return False, None
-    
+
+    async def check(self, key: str, max_requests: int, window_seconds: int) -> tuple[bool, Optional[int]]:
+        """is_rate_limited() for async code; blocking backends run in a worker thread"""
+        if not getattr(self.backend, "blocking", True):
+            return self.is_rate_limited(key, max_requests, window_seconds)
+        return await asyncio.to_thread(self.is_rate_limited, key, max_requests, window_seconds)
+
     def reset(self, key: str):
         """Reset rate limit for a key"""
-        with self._lock:
-            if key in self._requests:
-                del self._requests[key]
-    
+        self.backend.reset(key)
+
     def clear_all(self):
         """Clear all rate limiting data"""
-        with self._lock:
-            self._requests.clear()
+        self.backend.clear_all()
+
+    def size(self) -> int:
+        return self.backend.size()
+
+    def stop(self):
+        """Stop the background sweeper"""
+        self._stopped.set()
 
 
 # Global rate limiter instance
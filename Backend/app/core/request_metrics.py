@@ -0,0 +1,86 @@
+"""
+ASGI middleware that records per-route request metrics: latency histograms,
+status code counts and in-flight gauges. Routes are labelled by their path
+template (e.g. /api/status/user-status) rather than the raw URL, so path
+parameters don't create new series. Each response also gets a
+`Server-Timing: app;dur=<ms>` header with the time to first byte. The
+request is also the root span of its trace (see app.core.tracing).
+"""
+
+from app.core.metrics import registry
+from app.core.tracing import span, current_span
+import time
+
+UNMATCHED_ROUTE = "unmatched"
+
+http_requests = registry.counter(
+    "http_requests_total",
+    "HTTP requests by route, method and status code",
+    ("method", "route", "status")
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the last body chunk is sent (includes streaming)",
+    ("method", "route")
+)
+http_response_start_seconds = registry.histogram(
+    "http_response_start_seconds",
+    "HTTP latency until the response headers are sent",
+    ("method", "route")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ("method",)
+)
+
+
+def route_label(scope) -> str:
+    """Path template of the route that handled the request"""
+    route = scope.get("route")
+    path = getattr(route, "path_format", None) or getattr(route, "path", None)
+    return path or UNMATCHED_ROUTE
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500  # Reported if the app fails before sending a response
+        response_started = False
+        http_requests_in_flight.inc(method=method)
+
+        async def send_with_metrics(message):
+            nonlocal status, response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+                http_response_start_seconds.observe(elapsed, method=method, route=route_label(scope))
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"app;dur={elapsed * 1000:.1f}".encode("latin-1")))
+                traced = current_span()
+                if traced is not None and traced.trace.sampled:
+                    # Lets a slow response be looked up in the trace collector
+                    headers.append((b"x-trace-id", traced.trace.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with span("http.request", method=method) as request_span:
+            try:
+                await self.app(scope, receive, send_with_metrics)
+            finally:
+                route = route_label(scope)
+                status = status if response_started else 500
+                http_requests_in_flight.dec(method=method)
+                http_request_seconds.observe(time.perf_counter() - started, method=method, route=route)
+                http_requests.inc(method=method, route=route, status=str(status))
+                request_span.name = f"{method} {route}"
+                request_span.set(status=status)
@@ -0,0 +1,228 @@
+"""
+Circuit breakers and bulkheads for the services the API depends on (Qdrant,
+Supabase, OpenAI). Each dependency has a bulkhead, a cap on how many calls
+may be in flight at once, so a slow service can't tie up every request, and
+a breaker that opens after repeated failures or slow calls. While a breaker
+is open, calls fail immediately with DependencyUnavailable and callers take
+their degraded path (fallback question, "assume no embedding", 503) instead
+of waiting on a timeout. After BREAKER_RESET_SECONDS one probe call is let
+through; its outcome closes or re-opens the breaker.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from app.core.metrics import registry
+from app.core.tracing import span
+import threading
+import asyncio
+import time
+import os
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # Consecutive failures
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# How long a call may wait for a bulkhead slot before it is rejected
+BULKHEAD_WAIT_SECONDS = float(os.getenv("BULKHEAD_WAIT_SECONDS", "0.25"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+dependency_calls = registry.counter(
+    "dependency_calls_total",
+    "Calls to external services by outcome (ok, slow, error, client_error, rejected_open, rejected_full)",
+    ("dependency", "outcome")
+)
+breaker_transitions = registry.counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes",
+    ("dependency", "state")
+)
+breaker_state = registry.gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ("dependency",)
+)
+bulkhead_in_use = registry.gauge(
+    "bulkhead_in_use",
+    "Calls currently holding a bulkhead slot",
+    ("dependency",)
+)
+
+
+class DependencyUnavailable(Exception):
+    """Raised instead of calling a dependency whose breaker is open or whose bulkhead is full"""
+
+    def __init__(self, dependency: str, reason: str, retry_after: float):
+        super().__init__(f"{dependency} unavailable ({reason})")
+        self.dependency = dependency
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_client_error(error: BaseException) -> bool:
+    """4xx responses (other than timeouts and throttling) say nothing about the service's health"""
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return 400 <= status < 500 and status not in (408, 429)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            breaker_transitions.inc(dependency=self.name, state=state)
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead. In half-open state only one probe runs at a time"""
+        with self._lock:
+            if self.state == OPEN:
+                if self.retry_after() > 0:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def release(self):
+        """The call ended without a verdict (e.g. cancelled); let another probe through"""
+        with self._lock:
+            self._probing = False
+
+    def reset(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+
+# name -> DependencyGuard, for the state metrics
+guards: Dict[str, "DependencyGuard"] = {}
+
+
+class DependencyGuard:
+    """Circuit breaker plus bulkhead for one dependency"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        slow_call_seconds: float,
+        bulkhead_wait: Optional[float] = BULKHEAD_WAIT_SECONDS
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.slow_call_seconds = slow_call_seconds
+        self.bulkhead_wait = bulkhead_wait
+        self.breaker = CircuitBreaker(name)
+        self.in_use = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        guards[name] = self
+
+    def has_free_slot(self) -> bool:
+        """Whether a call could start now without waiting for the bulkhead"""
+        return not self._semaphore.locked()
+
+    def _reject(self, reason: str, retry_after: float):
+        dependency_calls.inc(dependency=self.name, outcome=f"rejected_{reason}")
+        raise DependencyUnavailable(self.name, reason, retry_after)
+
+    @asynccontextmanager
+    async def guard(self, wait: Optional[float] = -1):
+        """
+        Hold a bulkhead slot for the duration of a call to the dependency and feed
+        its outcome to the breaker. `wait` caps the wait for a slot (default
+        bulkhead_wait; None waits indefinitely). Raises DependencyUnavailable
+        without calling when the breaker is open or no slot frees up in time.
+        """
+        if not self.breaker.allow():
+            self._reject("open", self.breaker.retry_after())
+
+        wait = self.bulkhead_wait if wait == -1 else wait
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), wait)
+        except asyncio.TimeoutError:
+            self.breaker.release()
+            self._reject("full", wait or 0)
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        self.in_use += 1
+        started = time.perf_counter()
+        verdict = None
+        try:
+            yield
+            verdict = "slow" if time.perf_counter() - started > self.slow_call_seconds else "ok"
+        except Exception as e:
+            verdict = "client_error" if is_client_error(e) else "error"
+            raise
+        except BaseException:
+            # Cancelled, e.g. by a deadline or a hedged attempt that won; only a slow call counts
+            if time.perf_counter() - started > self.slow_call_seconds:
+                verdict = "slow"
+            raise
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+            if verdict in ("ok", "client_error"):
+                self.breaker.record_success()
+            elif verdict in ("slow", "error"):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            if verdict:
+                dependency_calls.inc(dependency=self.name, outcome=verdict)
+
+    async def run_sync(self, func, *args, **kwargs):
+        """Run a blocking client call in a thread, inside the guard and a span named after the call"""
+        with span(f"{self.name}.{getattr(func, '__name__', 'call')}"):
+            async with self.guard():
+                return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def _breaker_states():
+    return {(name,): STATE_VALUES[guard.breaker.state] for name, guard in list(guards.items())}
+
+
+def _bulkheads_in_use():
+    return {(name,): guard.in_use for name, guard in list(guards.items())}
+
+
+breaker_state.set_function(_breaker_states)
+bulkhead_in_use.set_function(_bulkheads_in_use)
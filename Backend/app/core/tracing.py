@@ -0,0 +1,198 @@
+"""
+Lightweight tracing of dependency calls (OpenAI, Qdrant, Supabase, Postgres).
+`span(name, **attributes)` times a block and links it to the enclosing span
+through a context variable, so a request's spans form one trace. Whether a
+trace is kept is decided once, at its root, with probability
+TRACE_SAMPLE_RATE; unsampled spans only feed the span_duration_seconds
+histogram. Finished traces go to an in-process ring buffer (`collector`) and,
+if TRACE_FILE is set, are appended to it as JSON lines.
+
+A trace is exported when its root span finishes. Spans that finish later (a
+background task or job started inside the request) are still recorded: they
+are added to the trace in the ring buffer, and written to TRACE_FILE as a
+follow-up line {"trace_id", "follow_up": true, "spans": [...]} that readers
+merge by trace_id.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from app.core.metrics import registry
+import threading
+import logging
+import random
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "500"))  # Recent sampled traces kept in memory
+TRACE_FILE = os.getenv("TRACE_FILE")  # e.g. traces.jsonl; unset keeps traces in memory only
+# Cap on recorded string attributes such as SQL statements
+TRACE_MAX_ATTRIBUTE_LENGTH = int(os.getenv("TRACE_MAX_ATTRIBUTE_LENGTH", "300"))
+
+span_seconds = registry.histogram(
+    "span_duration_seconds",
+    "Duration of traced dependency calls, sampled or not",
+    ("span", "status")
+)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _new_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+class Trace:
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List[Dict[str, Any]] = []
+        self.exported: Optional[Dict[str, Any]] = None  # The collector's record, once the root has finished
+
+
+class Span:
+    __slots__ = ("name", "trace", "span_id", "parent_id", "started_at", "started", "attributes", "status", "error")
+
+    def __init__(self, name: str, trace: Trace, parent_id: Optional[str]):
+        self.name = name
+        self.trace = trace
+        self.span_id = _new_id() if trace.sampled else ""
+        self.parent_id = parent_id
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        """Attach attributes (sizes, token counts, ...); ignored when the trace isn't sampled"""
+        if self.trace.sampled:
+            for key, value in attributes.items():
+                if isinstance(value, str) and len(value) > TRACE_MAX_ATTRIBUTE_LENGTH:
+                    value = value[:TRACE_MAX_ATTRIBUTE_LENGTH] + "..."
+                self.attributes[key] = value
+
+    def fail(self, error: BaseException):
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"[:TRACE_MAX_ATTRIBUTE_LENGTH]
+
+    def finish(self):
+        duration = time.perf_counter() - self.started
+        span_seconds.observe(duration, span=self.name, status=self.status)
+        if not self.trace.sampled:
+            return
+        record = {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+        if self.error:
+            record["error"] = self.error
+        self.trace.spans.append(record)
+        if self.parent_id is None:
+            collector.export(self.trace)
+        elif self.trace.exported is not None:
+            collector.export_late_span(self.trace, record)
+
+
+def start_span(name: str, root: bool = True, **attributes) -> Span:
+    """
+    Start a span under the current one without activating it. With no current span it
+    starts a new, possibly sampled, trace; with root=False it is only timed instead
+    (for chatty calls such as SQL that would flood the buffer with one-span traces).
+    """
+    parent = _current_span.get()
+    if parent is None:
+        sampled = root and random.random() < TRACE_SAMPLE_RATE
+        span = Span(name, Trace(_new_id() + _new_id() if sampled else "", sampled), None)
+    else:
+        span = Span(name, parent.trace, parent.span_id)
+    span.set(**attributes)
+    return span
+
+
+@contextmanager
+def span(name: str, root: bool = True, **attributes):
+    """Time the enclosed block as a child of the current span"""
+    current = start_span(name, root, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class TraceCollector:
+    """Ring buffer of recent sampled traces, optionally mirrored to a JSONL file"""
+
+    def __init__(self, max_traces: int = TRACE_BUFFER_SIZE, path: Optional[str] = TRACE_FILE):
+        self.path = path
+        self._traces: "deque[Dict[str, Any]]" = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        root = trace.spans[-1]
+        record = {
+            "trace_id": trace.trace_id,
+            "name": root["name"],
+            "start": root["start"],
+            "duration_ms": root["duration_ms"],
+            "spans": sorted(trace.spans, key=lambda s: s["start"])
+        }
+        with self._lock:
+            trace.exported = record
+            self._traces.append(record)
+            self._write(record)
+
+    def export_late_span(self, trace: Trace, span_record: Dict[str, Any]):
+        """Add a span that finished after its trace was exported"""
+        with self._lock:
+            record = trace.exported
+            # Replaced rather than appended to, so a reader holding the old list isn't affected
+            record["spans"] = sorted(record["spans"] + [span_record], key=lambda s: s["start"])
+            record["late_spans"] = record.get("late_spans", 0) + 1
+            self._write({"trace_id": trace.trace_id, "follow_up": True, "spans": [span_record]})
+
+    def _write(self, record: Dict[str, Any]):
+        if self.path:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+            except OSError as e:
+                logger.warning("Could not write trace to %s: %s", self.path, e)
+
+    def recent(self, limit: int = 50, min_duration_ms: float = 0, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent traces first"""
+        with self._lock:
+            traces = list(self._traces)
+        matching = [
+            trace for trace in reversed(traces)
+            if trace["duration_ms"] >= min_duration_ms and (name is None or trace["name"] == name)
+        ]
+        return matching[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+# Global trace collector instance
+collector = TraceCollector()
@@ -0,0 +1,185 @@
+"""
+Read-through cache of user records, keyed by email and by id.
+Entries are detached snapshots of the User row kept in an LRU with a TTL.
+"Not found" is cached too, for a shorter time, since unregistered users poll
+the status endpoint. Concurrent misses for the same key share one database
+query (single-flight); if the request running it is cancelled (e.g. the client
+disconnected), the waiting requests retry the load instead of being cancelled
+too. Writers must call put() or invalidate().
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user_model import User
+from app.core.metrics import registry
+import threading
+import asyncio
+import time
+import os
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+# Kept short: another worker process may create the user without touching this cache
+USER_CACHE_NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL", "5"))
+
+user_cache_requests = registry.counter(
+    "user_cache_requests_total",
+    "User lookups answered from the cache (hit), the database (miss) or another request's query (coalesced)",
+    ("key_type", "result")
+)
+user_cache_hit_ratio = registry.gauge(
+    "user_cache_hit_ratio",
+    "Share of user lookups that did not query the database",
+    ("key_type",)
+)
+
+
+def _hit_ratios():
+    ratios = {}
+    for key_type in ("email", "id"):
+        hits = user_cache_requests.value(key_type=key_type, result="hit")
+        coalesced = user_cache_requests.value(key_type=key_type, result="coalesced")
+        misses = user_cache_requests.value(key_type=key_type, result="miss")
+        total = hits + coalesced + misses
+        if total:
+            ratios[(key_type,)] = (hits + coalesced) / total
+    return ratios
+
+
+user_cache_hit_ratio.set_function(_hit_ratios)
+
+# Result of a shared load whose leading request was cancelled; waiters load again
+_LEADER_CANCELLED = object()
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    name: str
+    email: str
+    phone: str
+    gender: str
+    orientation: str
+    accept_non_straight: bool
+    age_preference: Optional[int]
+    age: int
+
+    @classmethod
+    def from_model(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            phone=user.phone,
+            gender=user.gender,
+            orientation=user.orientation,
+            accept_non_straight=user.accept_non_straight,
+            age_preference=user.age_preference,
+            age=user.age
+        )
+
+
+class UserCache:
+    def __init__(self, max_entries: int = USER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (user or None, expires_at)
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def _get(self, key: tuple):
+        """Returns (found, user)"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return False, None
+            user, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, user
+
+    def _store(self, key: tuple, user: Optional[CachedUser]):
+        ttl = USER_CACHE_TTL if user is not None else USER_CACHE_NEGATIVE_TTL
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, user: User):
+        """Cache a freshly created or updated user under both keys"""
+        cached = user if isinstance(user, CachedUser) else CachedUser.from_model(user)
+        self._store(("email", cached.email), cached)
+        self._store(("id", cached.id), cached)
+
+    def invalidate(self, email: Optional[str] = None, user_id: Optional[int] = None):
+        with self._lock:
+            if email is not None:
+                self._entries.pop(("email", email), None)
+            if user_id is not None:
+                self._entries.pop(("id", user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def _load(self, key: tuple, query: Callable[[], Awaitable[Optional[User]]]) -> Optional[CachedUser]:
+        key_type = key[0]
+        while True:
+            found, user = self._get(key)
+            if found:
+                user_cache_requests.inc(key_type=key_type, result="hit")
+                return user
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                return await self._lead(key, query)
+
+            user_cache_requests.inc(key_type=key_type, result="coalesced")
+            user = await asyncio.shield(inflight)
+            if user is not _LEADER_CANCELLED:
+                return user
+
+    async def _lead(self, key: tuple, query: Callable[[], Awaitable[Optional[User]]]) -> Optional[CachedUser]:
+        """Run the query for `key` and share its result with concurrent callers"""
+        key_type = key[0]
+        user_cache_requests.inc(key_type=key_type, result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            row = await query()
+            user = CachedUser.from_model(row) if row is not None else None
+            if user is not None:
+                self.put(user)
+            else:
+                self._store(key, None)
+            future.set_result(user)
+            return user
+        except asyncio.CancelledError:
+            # Only this request went away; the others are still live and load again
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting on it; don't log "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_by_email(self, db: AsyncSession, email: str) -> Optional[CachedUser]:
+        async def query():
+            result = await db.execute(select(User).where(User.email == email))
+            return result.scalars().first()
+        return await self._load(("email", email), query)
+
+    async def get_by_id(self, db: AsyncSession, user_id: int) -> Optional[CachedUser]:
+        return await self._load(("id", user_id), lambda: db.get(User, user_id))
+
+
+# Global user cache instance
+user_cache = UserCache()
@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi import HTTPException
 from dotenv import load_dotenv
+from app.core.clients import clients
+from app.core.tracing import start_span
 
 import os
 
@@ -8,17 +13,176 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("SUPABASE_DB_URL")  # full postgres:// URL
 
-# Create engine with connection pooling disabled for better error handling
-if DATABASE_URL:
-    engine = create_engine(
+# Async pool sizing for the API workers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+
+def to_async_url(url: str):
+    """
+    Convert a sync database URL into its async driver equivalent.
+    postgres:// and postgresql:// (psycopg2) map to asyncpg, sqlite maps to aiosqlite.
+    """
+    parsed = make_url(url.replace("postgres://", "postgresql://", 1))
+    backend = parsed.get_backend_name()
+
+    if backend == "postgresql":
+        query = dict(parsed.query)
+        # asyncpg does not understand libpq's sslmode, it takes ssl instead
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return parsed.set(drivername="postgresql+asyncpg", query=query)
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+    return parsed
+
+
+SQL_VERBS = {"select", "insert", "update", "delete", "begin", "commit", "rollback"}
+
+
+def trace_queries(engine):
+    """
+    Record a span for every statement the engine executes. Queries outside a traced
+    request or job are only timed, so the job worker's polling doesn't fill the trace buffer.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "query"
+        context._trace_span = start_span(
+            f"db.{verb if verb in SQL_VERBS else 'query'}",
+            root=False,
+            statement=statement,
+            executemany=executemany
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        current = getattr(context, "_trace_span", None)
+        if current is not None:
+            current.set(rowcount=cursor.rowcount)
+            current.finish()
+            context._trace_span = None
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        current = getattr(exception_context.execution_context, "_trace_span", None)
+        if current is not None:
+            current.fail(exception_context.original_exception)
+            current.finish()
+            exception_context.execution_context._trace_span = None
+
+    return engine
+
+
+def create_sync_engine():
+    if not DATABASE_URL:
+        return None
+    return trace_queries(create_engine(
         DATABASE_URL,
         pool_pre_ping=True,  # Verify connections before using them
         connect_args={"connect_timeout": 10}  # 10 second timeout
-    )
-    SessionLocal = sessionmaker(bind=engine)
-else:
-    engine = None
-    SessionLocal = None
+    ))
+
+
+def create_async_db_engine():
+    if not DATABASE_URL:
+        return None
+    # Async engine used by the API endpoints so queries don't block the event loop
+    async_url = to_async_url(DATABASE_URL)
+    if async_url.get_backend_name() == "postgresql":
+        async_engine = create_async_engine(
+            async_url,
+            pool_pre_ping=True,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            connect_args={"timeout": 10}  # 10 second timeout
+        )
+    else:
+        async_engine = create_async_engine(async_url)
+    # Cursor events fire on the sync engine underneath
+    trace_queries(async_engine.sync_engine)
+    return async_engine
+
+
+def get_engine():
+    return clients.get("db_engine")
+
+
+def get_async_engine():
+    return clients.get("async_db_engine")
+
+
+def get_sessionmaker():
+    """Sync session factory for scripts (matchmaking), or None without a database"""
+    return clients.get("db_session")
+
+
+def get_async_sessionmaker():
+    """Async session factory, or None without a database"""
+    return clients.get("async_db_session")
+
+
+def has_database() -> bool:
+    return bool(DATABASE_URL)
+
+
+def async_session() -> AsyncSession:
+    """New session from the shared async factory. Only call when has_database()"""
+    return get_async_sessionmaker()()
+
+
+async def ping_async_engine(async_engine):
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+# Engines are created on first use, not at import
+clients.register(
+    "db_engine",
+    create_sync_engine,
+    close=lambda engine: engine.dispose()
+)
+clients.register(
+    "db_session",
+    lambda: sessionmaker(bind=get_engine()) if DATABASE_URL else None
+)
+clients.register(
+    "async_db_engine",
+    create_async_db_engine,
+    close=lambda async_engine: async_engine.dispose(),
+    warmup=ping_async_engine
+)
+clients.register(
+    "async_db_session",
+    lambda: async_sessionmaker(
+        bind=get_async_engine(),
+        class_=AsyncSession,
+        expire_on_commit=False  # Keep attributes readable after commit without a refresh query
+    ) if DATABASE_URL else None
+)
+
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "SessionLocal": get_sessionmaker,
+    "async_engine": get_async_engine,
+    "AsyncSessionLocal": get_async_sessionmaker
+}
+
+
+def __getattr__(name):
+    # Keeps `from app.db.database import engine, SessionLocal` working for scripts
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Declarative base for models
 Base = declarative_base()
+
+
+# Dependency to get an async DB session
+async def get_db():
+    session_factory = get_async_sessionmaker()
+    if session_factory is None:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    async with session_factory() as db:
+        yield db
@@ -1,17 +1,144 @@
 import os
 import uuid
-from qdrant_client import QdrantClient
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.models import PointStruct
 from dotenv import load_dotenv
+from app.core.metrics import registry
+from app.core.clients import clients
+from app.utils.http_transport import get_sync_transport, get_async_transport
+from app.core.resilience import DependencyGuard
+from app.core.tracing import span
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Get Qdrant configuration from environment variables
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "find_my_date")
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))  # seconds per request
+# Bulkhead size and slow-call threshold for the async client's circuit breaker
+QDRANT_BULKHEAD_SIZE = int(os.getenv("QDRANT_BULKHEAD_SIZE", "32"))
+QDRANT_SLOW_CALL_SECONDS = float(os.getenv("QDRANT_SLOW_CALL_SECONDS", "2"))
+# gRPC sends vectors as packed floats instead of JSON text; needs the gRPC port reachable
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+# Write-behind buffer: upsert when this many points are queued or after the wait deadline
+QDRANT_WRITE_BATCH_SIZE = int(os.getenv("QDRANT_WRITE_BATCH_SIZE", "64"))
+QDRANT_WRITE_BATCH_WAIT_MS = float(os.getenv("QDRANT_WRITE_BATCH_WAIT_MS", "50"))
+
+# How long a presence check result is trusted. Absence is kept short because another
+# worker process may store the embedding without touching this process's cache.
+EMBEDDING_PRESENCE_TTL = float(os.getenv("EMBEDDING_PRESENCE_TTL", "300"))
+EMBEDDING_ABSENCE_TTL = float(os.getenv("EMBEDDING_ABSENCE_TTL", "5"))
+EMBEDDING_PRESENCE_CACHE_SIZE = int(os.getenv("EMBEDDING_PRESENCE_CACHE_SIZE", "50000"))
+
+
+def get_qdrant() -> QdrantClient:
+    return clients.get("qdrant")
+
+
+def get_async_qdrant() -> AsyncQdrantClient:
+    """Async client for the API endpoints so Qdrant round trips don't block the event loop"""
+    return clients.get("async_qdrant")
+
+
+clients.register(
+    "qdrant",
+    # Extra keyword arguments are passed on to the REST client's httpx.Client
+    lambda: QdrantClient(
+        host=QDRANT_HOST, port=QDRANT_PORT, timeout=QDRANT_TIMEOUT, transport=get_sync_transport()
+    ),
+    close=lambda client: client.close()
+)
+clients.register(
+    "async_qdrant",
+    lambda: AsyncQdrantClient(
+        host=QDRANT_HOST,
+        port=QDRANT_PORT,
+        grpc_port=QDRANT_GRPC_PORT,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        timeout=QDRANT_TIMEOUT,
+        transport=get_async_transport()
+    ),
+    close=lambda client: client.close(),
+    warmup=lambda client: client.get_collections()
+)
+
+
+# Global Qdrant guard instance, used by the async helpers below
+qdrant_guard = DependencyGuard("qdrant", QDRANT_BULKHEAD_SIZE, QDRANT_SLOW_CALL_SECONDS)
+
+
+def __getattr__(name):
+    # Keeps `from app.db.qdrant_client import qdrant` working without connecting at import
+    if name == "qdrant":
+        return get_qdrant()
+    if name == "async_qdrant":
+        return get_async_qdrant()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+qdrant_write_batch_points = registry.histogram(
+    "qdrant_write_batch_points",
+    "Points per batched embedding upsert",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+embedding_presence_lookups = registry.counter(
+    "embedding_presence_lookups_total",
+    "Embedding presence checks answered from the cache (hit) or Qdrant (miss)",
+    ("result",)
+)
+
+
+class PresenceCache:
+    """TTL cache of whether a user has a stored embedding"""
+
+    def __init__(self, max_entries: int = EMBEDDING_PRESENCE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # email -> (present, expires_at)
+        self._lock = threading.Lock()
 
-qdrant = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    def get_many(self, user_emails: Iterable[str]) -> Dict[str, bool]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for email in user_emails:
+                item = self._entries.get(email)
+                if item is None:
+                    continue
+                present, expires_at = item
+                if expires_at <= now:
+                    del self._entries[email]
+                    continue
+                found[email] = present
+        return found
+
+    def put(self, user_email: str, present: bool):
+        ttl = EMBEDDING_PRESENCE_TTL if present else EMBEDDING_ABSENCE_TTL
+        with self._lock:
+            self._entries[user_email] = (present, time.monotonic() + ttl)
+            self._entries.move_to_end(user_email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_email: str):
+        with self._lock:
+            self._entries.pop(user_email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+embedding_presence = PresenceCache()
 
 def email_to_uuid(email: str) -> str:
     """Convert email to a consistent UUID using namespace UUID"""
@@ -19,29 +146,229 @@ def email_to_uuid(email: str) -> str:
     namespace = uuid.UUID('6ba7b810-9dad-11d1-80b4-00c04fd430c8')  # DNS namespace
     return str(uuid.uuid5(namespace, email))
 
+def embedding_point(vector, user_email, chat_hash=None, model_version=None):
+    payload = {"email": user_email}  # Store email in payload for reference
+    if chat_hash:
+        payload["chat_hash"] = chat_hash  # Lets a resent chat skip re-embedding
+    if model_version:
+        payload["model_version"] = model_version  # Which embedding model produced the vector
+    return PointStruct(
+        id=email_to_uuid(user_email),
+        vector=vector.tolist(),
+        payload=payload
+    )
+
 # vectors is a 1D nparray
 def store_embedding(vector, user_email):
-    point_id = email_to_uuid(user_email)
-    qdrant.upsert(
-        collection_name=QDRANT_COLLECTION,
-        points=[PointStruct(
-            id=point_id, 
-            vector=vector.tolist(),
-            payload={"email": user_email}  # Store email in payload for reference
-        )],
-    )
+    with span("qdrant.upsert", points=1, dimensions=len(vector)):
+        get_qdrant().upsert(
+            collection_name=QDRANT_COLLECTION,
+            points=[embedding_point(vector, user_email)],
+        )
+    embedding_presence.put(user_email, True)
+
+class EmbeddingWriteBuffer:
+    """
+    Write-behind buffer that coalesces embedding upserts from concurrent callers into
+    batched Qdrant requests, flushed by size or deadline. Only the latest point per user
+    is kept, batches are sent one at a time in order, and points that are queued or
+    being sent are visible to the read helpers below (read-your-writes).
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = QDRANT_WRITE_BATCH_SIZE,
+        max_wait_ms: float = QDRANT_WRITE_BATCH_WAIT_MS,
+        collection: str = QDRANT_COLLECTION
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.collection = collection
+        self._pending: "OrderedDict[str, PointStruct]" = OrderedDict()  # Not yet sent, by email
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._in_flight: Dict[str, PointStruct] = {}  # Sent, not yet acknowledged
+        self._timer = None
+        self._tasks = set()  # Keep references so in-flight batches aren't garbage collected
+        self._send_lock = None  # Created on first use, inside the event loop
+
+    def put(self, user_email: str, point: PointStruct) -> asyncio.Future:
+        """Queue a point; the future resolves once the batch holding it is stored"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # A newer vector for the same user replaces the queued one
+        self._pending[user_email] = point
+        self._pending.move_to_end(user_email)
+        self._waiters.setdefault(user_email, []).append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+        return future
+
+    def pending_point(self, user_email: str) -> Optional[PointStruct]:
+        """The user's point if it's queued or being sent, else None"""
+        return self._pending.get(user_email) or self._in_flight.get(user_email)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                email, point = self._pending.popitem(last=False)
+                self._in_flight[email] = point  # Stays readable until the batch is acknowledged
+                batch.append((email, point, self._waiters.pop(email, [])))
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+
+        try:
+            # One batch at a time, in queue order, so an older vector never lands after a newer one
+            async with self._send_lock:
+                with span("qdrant.upsert", points=len(batch), dimensions=len(batch[0][1].vector)):
+                    async with qdrant_guard.guard():
+                        await get_async_qdrant().upsert(
+                            collection_name=self.collection,
+                            points=[point for _, point, _ in batch],
+                            wait=True
+                        )
+            qdrant_write_batch_points.observe(len(batch))
+        except Exception as e:
+            for _, _, waiters in batch:
+                for future in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        finally:
+            for email, point, _ in batch:
+                if self._in_flight.get(email) is point:
+                    del self._in_flight[email]
+
+        for email, _, waiters in batch:
+            embedding_presence.put(email, True)
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+
+    async def flush(self):
+        """Send everything queued and wait for all outstanding batches"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self):
+        """Flush on shutdown so queued vectors aren't lost"""
+        pending = len(self._pending) + len(self._in_flight)
+        await self.flush()
+        if pending:
+            logger.info("Flushed %d buffered embedding writes on shutdown", pending)
+
+
+# Global embedding write buffer instance
+embedding_writes = EmbeddingWriteBuffer()
+
+async def store_embedding_async(vector, user_email, chat_hash=None, model_version=None):
+    """Queue the user's vector in the write buffer and wait until its batch is stored"""
+    future = embedding_writes.put(user_email, embedding_point(vector, user_email, chat_hash, model_version))
+    await future
 
 def get_embedding(user_email):
     point_id = email_to_uuid(user_email)
     try:
-        result = qdrant.retrieve(
-            collection_name=QDRANT_COLLECTION,
-            ids=[point_id],
-            with_vectors=True  # Important: retrieve the actual vectors!
-        )
+        with span("qdrant.retrieve", ids=1, with_vectors=True):
+            result = get_qdrant().retrieve(
+                collection_name=QDRANT_COLLECTION,
+                ids=[point_id],
+                with_vectors=True  # Important: retrieve the actual vectors!
+            )
+        if result and len(result) > 0:
+            return result[0].vector
+        return None
+    except Exception as e:
+        print(f"Error retrieving embedding: {e}")
+        return None
+
+async def get_embedding_async(user_email):
+    buffered = embedding_writes.pending_point(user_email)
+    if buffered is not None:
+        return buffered.vector
+    point_id = email_to_uuid(user_email)
+    try:
+        with span("qdrant.retrieve", ids=1, with_vectors=True):
+            async with qdrant_guard.guard():
+                result = await get_async_qdrant().retrieve(
+                    collection_name=QDRANT_COLLECTION,
+                    ids=[point_id],
+                    with_vectors=True
+                )
         if result and len(result) > 0:
             return result[0].vector
         return None
     except Exception as e:
         print(f"Error retrieving embedding: {e}")
-        return None
\ No newline at end of file
+        return None
+
+async def get_chat_hash_async(user_email):
+    """Return the chat hash stored with the user's vector, without downloading the vector"""
+    buffered = embedding_writes.pending_point(user_email)
+    if buffered is not None:
+        return buffered.payload.get("chat_hash")
+    point_id = email_to_uuid(user_email)
+    try:
+        with span("qdrant.retrieve", ids=1, with_vectors=False):
+            async with qdrant_guard.guard():
+                result = await get_async_qdrant().retrieve(
+                    collection_name=QDRANT_COLLECTION,
+                    ids=[point_id],
+                    with_payload=["chat_hash"],
+                    with_vectors=False
+                )
+        if result and len(result) > 0 and result[0].payload:
+            return result[0].payload.get("chat_hash")
+        return None
+    except Exception as e:
+        print(f"Error retrieving chat hash: {e}")
+        return None
+
+async def has_embeddings_async(user_emails) -> Dict[str, bool]:
+    """
+    Check which users have a stored embedding, in one request that skips vectors and payloads.
+    Unlike get_embedding_async, Qdrant errors (including DependencyUnavailable while the
+    breaker is open) are raised so callers can tell "no" from "unknown".
+    """
+    user_emails = list(dict.fromkeys(user_emails))
+    presence = embedding_presence.get_many(user_emails)
+    # Vectors still in the write buffer count as stored, even over a cached "no"
+    for email in user_emails:
+        if not presence.get(email) and embedding_writes.pending_point(email) is not None:
+            presence[email] = True
+    missing = [email for email in user_emails if email not in presence]
+    embedding_presence_lookups.inc(len(presence), result="hit")
+
+    if missing:
+        embedding_presence_lookups.inc(len(missing), result="miss")
+        with span("qdrant.retrieve", ids=len(missing), with_vectors=False) as current:
+            async with qdrant_guard.guard():
+                points = await get_async_qdrant().retrieve(
+                    collection_name=QDRANT_COLLECTION,
+                    ids=[email_to_uuid(email) for email in missing],
+                    with_payload=False,
+                    with_vectors=False
+                )
+            current.set(found=len(points))
+        found_ids = {str(point.id) for point in points}
+        for email in missing:
+            presence[email] = email_to_uuid(email) in found_ids
+            embedding_presence.put(email, presence[email])
+
+    return {email: presence[email] for email in user_emails}
+
+async def has_embedding_async(user_email) -> bool:
+    return (await has_embeddings_async([user_email]))[user_email]
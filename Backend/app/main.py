@@ -1,23 +1,63 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import users, chat, auth, status, round1_results
-from app.db.database import Base, engine
+from app.api import users, chat, auth, status, round1_results, metrics
+from app.core.embedding_jobs import embedding_worker_pool
+from app.core.question_pool import question_pool
+from app.core.clients import clients
+from app.core.auth_tokens import token_verifier
+from app.core.request_metrics import RequestMetricsMiddleware
+from app.db.qdrant_client import embedding_writes
+from app.db.database import Base, get_async_engine, has_database
 import logging
+import asyncio
+import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-if engine:
+# Open connections to the services the API uses at startup instead of on the first request
+APP_WARMUP = os.getenv("APP_WARMUP", "false").lower() == "true"
+WARMUP_CLIENTS = ("async_db_engine", "async_db_session", "async_qdrant", "openai", "supabase")
+# Table creation is normally left to alembic; kept on by default for existing deployments
+DB_CREATE_TABLES = os.getenv("DB_CREATE_TABLES", "true").lower() == "true"
+
+
+async def create_tables():
+    if not has_database():
+        logger.warning("⚠️  DATABASE_URL not configured. Running without database.")
+        return
     try:
-        Base.metadata.create_all(bind=engine)
+        async with get_async_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("✅ Database tables created successfully")
     except Exception as e:
         logger.warning(f"⚠️  Database connection failed: {e}")
         logger.warning("⚠️  App will run without database. Auth endpoints will still work.")
-else:
-    logger.warning("⚠️  DATABASE_URL not configured. Running without database.")
 
-app = FastAPI(title="FindYourDate API", version="1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup = []
+    if DB_CREATE_TABLES:
+        startup.append(create_tables())
+    if APP_WARMUP:
+        startup.append(clients.warm_up(WARMUP_CLIENTS))
+        startup.append(token_verifier.refresh_keys_quietly())
+    await asyncio.gather(*startup)
+
+    # Background workers that embed completed questionnaires
+    await embedding_worker_pool.start()
+    # Load pre-generated opening questions and top them up in the background
+    await question_pool.start()
+    yield
+    await question_pool.stop()
+    await embedding_worker_pool.stop()
+    # Store buffered vectors before the Qdrant client is closed
+    await embedding_writes.close()
+    await clients.aclose()
+
+app = FastAPI(title="FindYourDate API", version="1.0", lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -33,14 +73,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Added last so it wraps everything else, CORS preflights included
+app.add_middleware(RequestMetricsMiddleware)
+
 # Include routers without additional prefix (prefix already in router definition)
 app.include_router(auth.router, prefix="/api", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(status.router, prefix="/api/status", tags=["Status"])
 app.include_router(round1_results.router, prefix="/api/round1", tags=["Round 1 Results"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 @app.get("/")
 def root():
@@ -2,3 +2,5 @@ from .base import Base
 from .user_model import User
 from .match_history import MatchHistory
 from .match_score import MatchScore
+from .embedding_job import EmbeddingJob
+from .questionnaire_session import QuestionnaireSession
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Enum, func
+from app.db.database import Base
+import enum
+
+class EmbeddingJobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class EmbeddingJob(Base):
+    __tablename__ = "embedding_jobs"
+
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String, index=True, nullable=False)
+    chat_history = Column(JSON, nullable=False)
+    status = Column(Enum(EmbeddingJobStatus), default=EmbeddingJobStatus.PENDING, index=True)
+    attempts = Column(Integer, default=0)
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<EmbeddingJob id={self.id} user={self.user_email} status={self.status}>"
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Boolean, JSON, DateTime, func
+from app.db.database import Base
+
+class QuestionnaireSession(Base):
+    __tablename__ = "questionnaire_sessions"
+
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String, unique=True, index=True, nullable=False)
+    chat_history = Column(JSON, nullable=False, default=list)
+    pending_question = Column(String, nullable=True)  # Last question sent, awaiting an answer
+    completed = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every save
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<QuestionnaireSession user={self.user_email} answers={len(self.chat_history or [])}>"
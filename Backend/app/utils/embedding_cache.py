@@ -0,0 +1,179 @@
+"""
+Content-addressed cache for text embeddings.
+Keys are a hash of the model name plus the normalized input text. Entries live
+in an in-memory LRU backed by a SQLite file on disk, so repeated texts skip the
+OpenAI call across requests and restarts.
+
+The disk tier is bounded: rows older than EMBEDDING_CACHE_TTL_DAYS are ignored
+and deleted, and once it holds more than EMBEDDING_CACHE_MAX_ROWS the oldest
+rows (by created_at) are pruned on insert. The file lives in DATA_DIR unless
+EMBEDDING_CACHE_PATH says otherwise.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import unicodedata
+import threading
+import hashlib
+import sqlite3
+import asyncio
+import time
+import os
+
+# Directory for local state files; defaults to Backend/data, whatever the working directory
+DATA_DIR = os.getenv("DATA_DIR", str(Path(__file__).parent.parent.parent / "data"))
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Set to an empty string to keep the cache in memory only
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite3"))
+# Limits for the disk tier; 0 disables either one
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+EMBEDDING_CACHE_TTL_DAYS = float(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "90"))
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivially different inputs share a key"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """LRU of embeddings in memory with a persistent SQLite tier"""
+
+    def __init__(
+        self,
+        max_entries: int = EMBEDDING_CACHE_SIZE,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        max_rows: int = EMBEDDING_CACHE_MAX_ROWS,
+        ttl_seconds: float = EMBEDDING_CACHE_TTL_DAYS * 86400
+    ):
+        self.max_entries = max_entries
+        self.path = path
+        self.max_rows = max_rows
+        self.ttl_seconds = ttl_seconds
+        self._rows = 0  # Upper bound on the rows on disk; replaced keys are counted twice until the next prune
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+
+    def _connection(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(embeddings)")}
+            if "created_at" not in columns:
+                # Files written before eviction existed; their rows count as the oldest
+                db.execute("ALTER TABLE embeddings ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+            db.commit()
+            self._rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._db = db
+        return self._db
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+
+    def _prune(self, db: sqlite3.Connection):
+        """Drop expired rows, then the oldest ones while over max_rows (caller holds _db_lock)"""
+        if self.ttl_seconds > 0:
+            db.execute("DELETE FROM embeddings WHERE created_at < ?", (self._cutoff(),))
+        if self.max_rows > 0 and self._rows > self.max_rows:
+            self._rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            # Prune a tenth below the limit so a full cache isn't pruned on every insert
+            excess = self._rows - int(self.max_rows * 0.9)
+            if self._rows > self.max_rows and excess > 0:
+                db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY created_at LIMIT ?)",
+                    (excess,)
+                )
+                self._rows -= excess
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_memory(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+        return found
+
+    def _get_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys or not self.path:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._db_lock:
+            rows = self._connection().execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders}) AND created_at >= ?",
+                keys + [self._cutoff()]
+            ).fetchall()
+
+        found = {}
+        for key, blob in rows:
+            vector = np.frombuffer(blob, dtype=np.float32).tolist()
+            self._remember(key, vector)
+            found[key] = vector
+        return found
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look keys up in memory first, then on disk. Missing keys are left out"""
+        found = self._get_memory(keys)
+        found.update(self._get_disk([key for key in keys if key not in found]))
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        for key, vector in items.items():
+            self._remember(key, vector)
+
+        if items and self.path:
+            now = time.time()
+            rows = [
+                (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for key, vector in items.items()
+            ]
+            with self._db_lock:
+                db = self._connection()
+                db.executemany("INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)", rows)
+                self._rows += len(rows)
+                self._prune(db)
+                db.commit()
+
+    async def aget_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = self._get_memory(keys)
+        missing = [key for key in keys if key not in found]
+        if missing and self.path:
+            # Disk lookups run in a thread so they stay off the event loop
+            found.update(await asyncio.to_thread(self._get_disk, missing))
+        return found
+
+    async def aput_many(self, items: Dict[str, List[float]]):
+        await asyncio.to_thread(self.put_many, items)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+# Global cache instance
+embedding_cache = EmbeddingCache()
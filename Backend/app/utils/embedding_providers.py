@@ -0,0 +1,179 @@
+"""
+Embedding providers behind one interface, chosen with EMBEDDING_PROVIDER:
+- openai: the OpenAI embeddings API (default, text-embedding-3-large)
+- local: hashed word and character n-gram features, deterministic and with no
+  network, for running the pipeline, load tests and benchmarks offline
+
+Each provider declares its dimensions, dtype and batch limit, and a
+`model_version` string. Cache keys, chat hashes and stored points carry the
+model version, so vectors from different models are never mixed up.
+"""
+
+from app.core.clients import clients
+from app.core.tracing import span
+from app.utils.embedding_cache import normalize_text
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Optional
+import numpy as np
+import hashlib
+import asyncio
+import re
+import os
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+# Unset uses the model's native size; must match the Qdrant collection
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+# Most inputs the OpenAI API accepts in one request
+OPENAI_EMBEDDING_MAX_INPUTS = int(os.getenv("OPENAI_EMBEDDING_MAX_INPUTS", "2048"))
+
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536
+}
+LOCAL_MODEL = "hashed-ngram-v1"
+LOCAL_DEFAULT_DIMENSIONS = 3072
+
+
+class EmbeddingProvider(ABC):
+    """Turns non-empty texts into vectors of `dimensions` floats, in input order"""
+
+    name = "base"
+    model = ""
+    dimensions = 0
+    dtype = "float32"
+    max_batch_size = 256
+
+    @property
+    def model_version(self) -> str:
+        return f"{self.name}/{self.model}@{self.dimensions}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, splitting them into requests of at most max_batch_size"""
+        vectors = []
+        for start in range(0, len(texts), self.max_batch_size):
+            vectors.extend(await self._embed_batch(texts[start:start + self.max_batch_size]))
+        return vectors
+
+    @abstractmethod
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed at most max_batch_size texts in one request"""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = "openai"
+    max_batch_size = OPENAI_EMBEDDING_MAX_INPUTS
+
+    def __init__(self, model: str = EMBEDDING_MODEL, dimensions: Optional[int] = EMBEDDING_DIMENSIONS):
+        self.model = model
+        # Only sent when set, since older models don't accept the parameter
+        self.requested_dimensions = dimensions
+        self.dimensions = dimensions or NATIVE_DIMENSIONS.get(model, 0)
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # Imported here so the local provider works without the OpenAI package configured
+        from app.utils.openai_client import get_openai, openai_embedding_slot, OPENAI_EMBEDDING_TIMEOUT
+
+        options = {"dimensions": self.requested_dimensions} if self.requested_dimensions else {}
+        with span(
+            "openai.embeddings", model=self.model, inputs=len(texts), input_chars=sum(map(len, texts))
+        ) as current:
+            async with openai_embedding_slot():
+                res = await get_openai().embeddings.create(
+                    model=self.model,
+                    input=texts,
+                    timeout=OPENAI_EMBEDDING_TIMEOUT,
+                    **options
+                )
+            usage = getattr(res, "usage", None)
+            current.set(
+                total_tokens=getattr(usage, "total_tokens", None),
+                dimensions=len(res.data[0].embedding) if res.data else 0
+            )
+
+        # The API may return items out of order, so place them by index
+        vectors = [None] * len(texts)
+        for item in res.data:
+            vectors[item.index] = item.embedding
+        return vectors
+
+
+@lru_cache(maxsize=200_000)
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashedNgramEmbeddingProvider(EmbeddingProvider):
+    """
+    Signed feature hashing of word unigrams, word bigrams and character n-grams,
+    L2-normalized. Texts sharing words and spellings get similar vectors; the
+    scores are not comparable with OpenAI's.
+    """
+
+    name = "local"
+    model = LOCAL_MODEL
+
+    def __init__(self, dimensions: Optional[int] = EMBEDDING_DIMENSIONS, char_ngrams=(3, 4)):
+        self.dimensions = dimensions or LOCAL_DEFAULT_DIMENSIONS
+        self.char_ngrams = char_ngrams
+        self._cached_word_hashes = lru_cache(maxsize=100_000)(self._word_hashes)
+
+    def _word_hashes(self, word: str) -> np.ndarray:
+        """Hashes of a word and its character n-grams; words repeat a lot, so these are cached"""
+        padded = f" {word} "
+        features = [f"w:{word}"]
+        for n in self.char_ngrams:
+            features.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+        return np.fromiter((_feature_hash(f) for f in features), dtype=np.uint64, count=len(features))
+
+    def _hashes(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", normalize_text(text).lower())
+        if not words:
+            return np.zeros(0, dtype=np.uint64)
+        bigrams = np.fromiter(
+            (_feature_hash(f"b:{a} {b}") for a, b in zip(words, words[1:])), dtype=np.uint64, count=len(words) - 1
+        )
+        return np.concatenate([self._cached_word_hashes(word) for word in words] + [bigrams])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        hashes = self._hashes(text)
+        if not hashes.size:
+            return np.zeros(self.dimensions, dtype=np.float32)
+        indices = (hashes % np.uint64(self.dimensions)).astype(np.int64)
+        # The top bit picks the sign, so collisions tend to cancel out instead of piling up
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        vector = np.bincount(indices, weights=signs, minlength=self.dimensions).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text).tolist() for text in texts]
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        with span("local.embeddings", model=self.model, inputs=len(texts), input_chars=sum(map(len, texts))):
+            # CPU-bound, keep it off the event loop
+            return await asyncio.to_thread(self.embed_sync, texts)
+
+
+PROVIDERS = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": HashedNgramEmbeddingProvider
+}
+
+
+def create_embedding_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER {name!r}, expected one of {sorted(PROVIDERS)}")
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    return clients.get("embedding_provider")
+
+
+clients.register("embedding_provider", create_embedding_provider)
@@ -1,13 +1,118 @@
-from openai import OpenAI
+"""
+Text embeddings from the configured provider (see embedding_providers).
+`get_text_embeddings` sends many inputs in one request, and `embedding_batcher`
+coalesces concurrent callers (e.g. many users finishing the questionnaire at
+once) into batched requests with a short flush deadline. Texts already in the
+embedding cache never reach the queue.
+"""
+
+from app.utils.embedding_providers import get_embedding_provider
+from app.utils.embedding_cache import embedding_cache, cache_key
+from typing import List
+import asyncio
+import logging
 import os
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+# Micro-batching: flush when this many texts are queued or after the wait deadline
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "25"))
+
+
+async def get_text_embeddings(texts: List[str]) -> List[List[float]]:
+    """Embed many texts with the configured provider, in as few requests as it allows. Empty texts map to []"""
+    inputs = [text for text in texts if text]
+    if not inputs:
+        return [[] for _ in texts]
+
+    vectors = await get_embedding_provider().embed(inputs)
+    results = iter(vectors)
+    return [next(results) if text else [] for text in texts]
 
-def get_text_embedding(text: str):
+
+async def get_text_embedding(text: str):
     if not text:
         return []
-    res = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=text
-    )
-    return res.data[0].embedding
\ No newline at end of file
+    vectors = await get_text_embeddings([text])
+    return vectors[0]
+
+
+class EmbeddingBatcher:
+    """Queue that coalesces embedding requests from concurrent callers into batched API calls"""
+
+    def __init__(
+        self,
+        max_batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+        cache=embedding_cache
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.cache = cache
+        self._pending = []  # (text, future) pairs waiting for the next flush
+        self._timer = None
+        self._tasks = set()  # Keep references so in-flight batches aren't garbage collected
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Queue texts for embedding and wait for their vectors"""
+        loop = asyncio.get_running_loop()
+        model_version = get_embedding_provider().model_version
+        keys = [cache_key(model_version, text) if text else None for text in texts]
+        cached = await self.cache.aget_many([key for key in keys if key]) if self.cache else {}
+
+        futures = []
+        for text, key in zip(texts, keys):
+            future = loop.create_future()
+            if not text:
+                future.set_result([])
+            elif key in cached:
+                future.set_result(cached[key])
+            else:
+                self._pending.append((text, future))
+            futures.append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            model_version = get_embedding_provider().model_version
+            vectors = await get_text_embeddings([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+        if self.cache:
+            try:
+                await self.cache.aput_many({
+                    cache_key(model_version, text): vector for (text, _), vector in zip(batch, vectors)
+                })
+            except Exception as e:
+                logger.warning(f"Failed to write embeddings to cache: {e}")
+
+
+# Global batcher instance
+embedding_batcher = EmbeddingBatcher()
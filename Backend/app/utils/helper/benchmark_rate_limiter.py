@@ -0,0 +1,99 @@
+"""
+Microbenchmark for the rate limiter.
+Measures is_rate_limited() throughput for a hot key and for many distinct
+keys, single-threaded and from several threads, and compares against the
+previous list-of-timestamps implementation kept below as a baseline. The
+shared backends (SQLite file, Redis protocol via the local stand-in server)
+are measured as well.
+
+Usage:
+    python -m app.utils.helper.benchmark_rate_limiter [calls] [threads]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import tempfile
+import time
+import sys
+import os
+
+from app.core.rate_limiter import RateLimiter, MemoryBackend, SQLiteBackend, RedisBackend
+from app.utils.helper.local_resp_server import LocalRespServer
+
+
+class ListRateLimiter:
+    """The old implementation: one global lock and a timestamp list per key"""
+
+    def __init__(self):
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def is_rate_limited(self, key, max_requests, window_seconds):
+        with self._lock:
+            cutoff_time = datetime.now() - timedelta(seconds=window_seconds)
+            requests = [t for t in self._requests.get(key, []) if t > cutoff_time]
+            self._requests[key] = requests
+            if len(requests) >= max_requests:
+                oldest_request = min(requests)
+                time_until_reset = (oldest_request + timedelta(seconds=window_seconds) - datetime.now()).total_seconds()
+                return True, int(time_until_reset) + 1
+            requests.append(datetime.now())
+            return False, None
+
+
+def run(limiter, calls: int, threads: int, keys: int, max_requests: int) -> float:
+    """Returns calls per second"""
+    per_thread = calls // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            limiter.is_rate_limited(f"chat:user{(offset + i) % keys}", max_requests, 600)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    scenarios = [
+        ("hot key, limit 15", 1, 1, 15),
+        ("hot key, limit 10000", 1, 1, 10_000),
+        ("50k keys, limit 15", 1, 50_000, 15),
+        (f"50k keys, {threads} threads", threads, 50_000, 15),
+    ]
+
+    print(f"{'scenario':<28} {'sliding window':>16} {'list baseline':>16}")
+    for name, scenario_threads, keys, max_requests in scenarios:
+        new = run(RateLimiter(MemoryBackend(), sweep_interval=0), calls, scenario_threads, keys, max_requests)
+        # The baseline degrades with the number of stored timestamps, so keep its runs short
+        old = run(ListRateLimiter(), min(calls, 50_000), scenario_threads, keys, max_requests)
+        print(f"{name:<28} {new:>12,.0f}/s {old:>12,.0f}/s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite_limiter = RateLimiter(SQLiteBackend(os.path.join(directory, "bench.sqlite3")), sweep_interval=0)
+        rate = run(sqlite_limiter, min(calls, 20_000), 1, 50_000, 15)
+        print(f"{'sqlite backend, 1 thread':<28} {rate:>12,.0f}/s")
+
+    server = LocalRespServer(port=0).start()
+    redis_limiter = RateLimiter(RedisBackend(server.url), sweep_interval=0)
+    rate = run(redis_limiter, min(calls, 20_000), 1, 50_000, 15)
+    print(f"{'redis stand-in, 1 thread':<28} {rate:>12,.0f}/s")
+    server.shutdown()
+
+    limiter = RateLimiter(MemoryBackend(), sweep_interval=0)
+    for i in range(100_000):
+        limiter.is_rate_limited(f"idle{i}", 15, 1)
+    time.sleep(2.1)
+    before = limiter.size()
+    started = time.perf_counter()
+    removed = limiter.sweep()
+    print(f"\nSweep: {removed:,} of {before:,} idle keys evicted in {time.perf_counter() - started:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+In-process stand-ins for the external services, for load tests and local runs
+without credentials:
+- FakeOpenAI: deterministic chat completions (plain, n>1 and streamed) and
+  embeddings, with configurable latency
+- FakeSupabase: auth calls backed by HS256 tokens signed with a local secret
+  (the same secret lets token_verifier check them locally)
+- local_qdrant(): Qdrant's in-memory local mode with the collection created
+
+`install_fakes()` puts them into the client registry with clients.override().
+"""
+
+from types import SimpleNamespace
+from typing import List, Optional
+from jose import jwt
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import VectorParams, Distance
+from app.core.clients import clients
+import numpy as np
+import hashlib
+import asyncio
+import random
+import time
+import uuid
+
+FAKE_JWT_SECRET = "load-test-secret"
+
+QUESTIONS = [
+    "What does a perfect weekend look like for you?",
+    "Which song always gets you on the dance floor?",
+    "How do your friends describe you in three words?",
+    "What is a small thing that instantly makes your day better?",
+    "Would you rather plan every detail or go with the flow?",
+    "What hobby could you talk about for hours?",
+    "How do you usually recharge after a long week?",
+    "What is the best trip you have ever taken?",
+    "Which movie could you rewatch forever?",
+    "What are you most excited about this year?"
+]
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def fake_vector(text: str, dimensions: int) -> List[float]:
+    """Unit vector derived from the text, so equal texts get equal embeddings"""
+    vector = np.random.default_rng(_seed(text)).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class Latency:
+    """Log-normal latency around a median, seeded so runs are repeatable"""
+
+    def __init__(self, median_ms: float, jitter: float = 0.3, seed: int = 0):
+        self.median = median_ms / 1000
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median * self._random.lognormvariate(0, self.jitter)
+
+    async def wait(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class _FakeStream:
+    def __init__(self, text: str, prompt_tokens: int, latency: float, include_usage: bool):
+        self.words = text.split(" ")
+        self.prompt_tokens = prompt_tokens
+        self.latency = latency
+        self.include_usage = include_usage
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        # Roughly a third of the time to the first token, the rest spread over the words
+        await asyncio.sleep(self.latency / 3)
+        per_word = (self.latency * 2 / 3) / len(self.words)
+        for index, word in enumerate(self.words):
+            await asyncio.sleep(per_word)
+            text = word if index == 0 else " " + word
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+        if self.include_usage:
+            completion_tokens = approx_tokens(" ".join(self.words))
+            yield SimpleNamespace(choices=[], usage=SimpleNamespace(
+                prompt_tokens=self.prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=self.prompt_tokens + completion_tokens
+            ))
+
+    async def close(self):
+        pass
+
+
+class _FakeCompletions:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def create(self, model: str, messages, n: int = 1, stream: bool = False, stream_options=None, **kwargs):
+        self.calls += 1
+        prompt = "".join(message["content"] for message in messages)
+        prompt_tokens = approx_tokens(prompt)
+        seed = _seed(prompt)
+        texts = [QUESTIONS[(seed + index) % len(QUESTIONS)] for index in range(n)]
+
+        if stream:
+            include_usage = bool(stream_options and stream_options.get("include_usage"))
+            return _FakeStream(texts[0], prompt_tokens, self.latency.sample(), include_usage)
+
+        await self.latency.wait()
+        completion_tokens = sum(approx_tokens(text) for text in texts)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text)) for text in texts],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+
+class _FakeEmbeddings:
+    def __init__(self, latency: Latency, dimensions: int):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.calls = 0
+
+    async def create(self, model: str, input, dimensions: Optional[int] = None, **kwargs):
+        self.calls += 1
+        texts = [input] if isinstance(input, str) else list(input)
+        await self.latency.wait()
+        size = dimensions or self.dimensions
+        tokens = sum(approx_tokens(text) for text in texts)
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=index, embedding=fake_vector(text, size)) for index, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens)
+        )
+
+
+class FakeOpenAI:
+    """Stands in for AsyncOpenAI: chat.completions.create and embeddings.create"""
+
+    def __init__(
+        self,
+        chat_latency_ms: float = 800,
+        embedding_latency_ms: float = 300,
+        jitter: float = 0.3,
+        embedding_dimensions: int = 3072,
+        seed: int = 0
+    ):
+        self.chat = SimpleNamespace(completions=_FakeCompletions(Latency(chat_latency_ms, jitter, seed)))
+        self.embeddings = _FakeEmbeddings(Latency(embedding_latency_ms, jitter, seed + 1), embedding_dimensions)
+
+    async def close(self):
+        pass
+
+
+def make_access_token(email: str, user_id: Optional[str] = None, ttl: int = 3600, secret: str = FAKE_JWT_SECRET) -> str:
+    """A Supabase-style access token signed with the local secret"""
+    now = int(time.time())
+    claims = {
+        "sub": user_id or str(uuid.uuid5(uuid.NAMESPACE_DNS, email)),
+        "email": email,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "iat": now,
+        "exp": now + ttl,
+        "user_metadata": {},
+        "app_metadata": {"provider": "google"}
+    }
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+
+class _FakeAuth:
+    def __init__(self, secret: str, latency: Latency):
+        self.secret = secret
+        self.latency = latency
+
+    def _user(self, claims):
+        return SimpleNamespace(
+            id=claims["sub"],
+            email=claims.get("email"),
+            user_metadata=claims.get("user_metadata", {}),
+            app_metadata=claims.get("app_metadata", {}),
+            created_at=None
+        )
+
+    def _session(self, email: str):
+        token = make_access_token(email, secret=self.secret)
+        claims = jwt.get_unverified_claims(token)
+        return SimpleNamespace(
+            session=SimpleNamespace(
+                access_token=token,
+                refresh_token=f"refresh-{email}",
+                expires_in=3600,
+                expires_at=claims["exp"],
+                token_type="bearer"
+            ),
+            user=self._user(claims)
+        )
+
+    def get_user(self, token: str):
+        time.sleep(self.latency.sample())  # The real client blocks too
+        claims = jwt.decode(token, self.secret, algorithms=["HS256"], audience="authenticated")
+        return SimpleNamespace(user=self._user(claims))
+
+    def exchange_code_for_session(self, params):
+        time.sleep(self.latency.sample())
+        return self._session(f"{params['auth_code']}@example.com")
+
+    def refresh_session(self, refresh_token: str):
+        time.sleep(self.latency.sample())
+        return self._session(refresh_token.replace("refresh-", "", 1))
+
+    def sign_out(self, token: str):
+        time.sleep(self.latency.sample())
+
+    def sign_in_with_oauth(self, credentials):
+        return SimpleNamespace(url="https://example.com/fake-oauth")
+
+
+class FakeSupabase:
+    """Just the auth surface of the Supabase client that the API uses"""
+
+    def __init__(self, secret: str = FAKE_JWT_SECRET, latency_ms: float = 50, seed: int = 0):
+        self.auth = _FakeAuth(secret, Latency(latency_ms, 0.3, seed + 2))
+
+
+async def local_qdrant(collection: str, dimensions: int) -> AsyncQdrantClient:
+    client = AsyncQdrantClient(":memory:")
+    await client.create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=dimensions, distance=Distance.COSINE)
+    )
+    return client
+
+
+async def install_fakes(
+    chat_latency_ms: float = 800,
+    embedding_latency_ms: float = 300,
+    auth_latency_ms: float = 50,
+    embedding_dimensions: int = 3072,
+    seed: int = 0
+) -> FakeOpenAI:
+    """Swap the OpenAI, Supabase and Qdrant clients for the fakes; returns the fake OpenAI client"""
+    from app.db.qdrant_client import QDRANT_COLLECTION
+    from app.core.auth_tokens import token_verifier
+
+    openai = FakeOpenAI(chat_latency_ms, embedding_latency_ms, embedding_dimensions=embedding_dimensions, seed=seed)
+    clients.override("openai", openai)
+    clients.override("supabase", FakeSupabase(latency_ms=auth_latency_ms, seed=seed))
+    clients.override("async_qdrant", await local_qdrant(QDRANT_COLLECTION, embedding_dimensions))
+    # Tokens from make_access_token verify locally, like HS256 Supabase projects
+    token_verifier.jwt_secret = FAKE_JWT_SECRET
+    token_verifier.jwks_url = ""
+    return openai
@@ -0,0 +1,306 @@
+"""
+Offline load test for the API.
+Runs app.main:app in-process (httpx ASGITransport, lifespan included) with the
+external services replaced by the fakes in fake_services: deterministic
+OpenAI chat/embeddings with configurable latency, HS256 Supabase auth, Qdrant
+in local memory mode, and a throwaway SQLite database (or --database-url for a
+local Postgres). Each virtual user registers, answers the 10-question chat,
+polls /user-status until its embedding is done, then checks its round 1
+result. Request starts across all users are paced to --rps, and the report
+gives throughput and latency percentiles per route.
+
+The embedding cache and rate-limit SQLite files also go into the temporary
+directory, so a run leaves nothing behind in the working directory.
+
+Usage:
+    python -m app.utils.helper.load_test [--users 200] [--rps 50] [--chat-latency-ms 800]
+        [--embedding-latency-ms 300] [--stream] [--database-url postgresql://localhost/findyourdate_load]
+"""
+
+from collections import defaultdict
+from typing import Dict, List
+import argparse
+import asyncio
+import tempfile
+import random
+import json
+import time
+import sys
+import os
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against in-process fakes")
+    parser.add_argument("--users", type=int, default=100, help="Virtual users, each runs the full scenario once")
+    parser.add_argument("--rps", type=float, default=50, help="Target request rate across all users")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Seconds over which users arrive")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between a user's requests, seconds")
+    parser.add_argument("--poll-interval", type=float, default=2, help="Seconds between /user-status polls")
+    parser.add_argument("--max-polls", type=int, default=30)
+    parser.add_argument("--stream", action="store_true", help="Use /next-question/stream for the chat")
+    parser.add_argument("--chat-latency-ms", type=float, default=800, help="Median fake chat completion latency")
+    parser.add_argument("--embedding-latency-ms", type=float, default=300, help="Median fake embedding latency")
+    parser.add_argument("--auth-latency-ms", type=float, default=50, help="Median fake Supabase auth latency")
+    parser.add_argument("--embedding-dimensions", type=int, help="Defaults to the embedding provider's size")
+    parser.add_argument("--database-url", help="Local Postgres URL; a temporary SQLite file is used otherwise")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, workdir: str):
+    """Must run before the app is imported, since its modules read the environment at import time"""
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'load_test.sqlite3')}"
+    os.environ["SUPABASE_DB_URL"] = database_url
+    os.environ["QUESTION_POOL_PATH"] = os.path.join(workdir, "question_pool.json")
+    os.environ["ROUND1_RESULTS_PUBLISHED"] = "true"
+    os.environ["MATCHES_JSON_PATH"] = os.path.join(workdir, "matches.json")
+    # The fakes' vectors are stored under the real model version, so they must never
+    # reach a cache file a real run could read later
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite3")
+    os.environ["RATE_LIMIT_SQLITE_PATH"] = os.path.join(workdir, "rate_limits.sqlite3")
+    os.environ.setdefault("DB_CREATE_TABLES", "true")
+    os.environ.setdefault("APP_WARMUP", "false")
+
+    # Users 2i and 2i+1 are matched with each other
+    matches = []
+    for i in range(0, args.users - 1, 2):
+        matches.append({"user_1": user_profile(i), "user_2": user_profile(i + 1)})
+    with open(os.environ["MATCHES_JSON_PATH"], "w") as f:
+        json.dump({"matches": matches}, f)
+
+
+def user_profile(index: int) -> Dict:
+    return {
+        "name": f"Load User {index}",
+        "email": f"load.user{index}@example.com",
+        "phone": f"9{index:09d}"
+    }
+
+
+class Pacer:
+    """Spaces request starts 1/rps apart across all users"""
+
+    def __init__(self, rps: float):
+        self.interval = 1 / rps if rps > 0 else 0
+        self._next = time.perf_counter()
+
+    async def wait(self):
+        now = time.perf_counter()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, route: str, status: str, seconds: float):
+        self.latencies[route].append(seconds)
+        self.statuses[route][status] += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class VirtualUser:
+    def __init__(self, index: int, http, pacer: Pacer, recorder: Recorder, args, rng: random.Random):
+        from app.utils.helper.fake_services import make_access_token
+
+        self.profile = user_profile(index)
+        self.email = self.profile["email"]
+        self.token = make_access_token(self.email)
+        self.cookie = {"Cookie": f"access_token={self.token}"}
+        self.index = index
+        self.http = http
+        self.pacer = pacer
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+        self.completed_chat = False
+        self.embedded = False
+
+    async def request(self, route: str, method: str, url: str, **kwargs):
+        await self.pacer.wait()
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+            status = str(response.status_code)
+        except Exception as e:
+            self.recorder.record(route, type(e).__name__, time.perf_counter() - started)
+            return None
+        self.recorder.record(route, status, time.perf_counter() - started)
+        return response
+
+    async def think(self):
+        if self.args.think_time > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+    async def register(self):
+        body = {
+            **self.profile,
+            "gender": "M" if self.index % 2 == 0 else "W",
+            "orientation": "straight",
+            "age": 18 + self.index % 6,
+            "accept_non_straight": True,
+            "age_preference": 0
+        }
+        await self.request("POST /api/users/", "POST", "/api/users/", json=body,
+                           headers={"Authorization": f"Bearer {self.token}"})
+
+    async def next_question(self, body: Dict):
+        if not self.args.stream:
+            response = await self.request(
+                "POST /api/chat/next-question", "POST", "/api/chat/next-question", json=body, headers=self.cookie
+            )
+            if response is None or response.status_code != 200:
+                return None
+            return response.json()
+
+        route = "POST /api/chat/next-question/stream"
+        await self.pacer.wait()
+        started = time.perf_counter()
+        done = None
+        try:
+            async with self.http.stream("POST", "/api/chat/next-question/stream", json=body, headers=self.cookie) as response:
+                status = str(response.status_code)
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: ") and event == "done":
+                        done = json.loads(line[len("data: "):])
+                    elif line.startswith("data: ") and event == "error":
+                        status = "stream_error"
+        except Exception as e:
+            status = type(e).__name__
+        self.recorder.record(route, status, time.perf_counter() - started)
+        return done
+
+    async def chat(self):
+        result = await self.next_question({"user_email": self.email, "chat_history": []})
+        while result and not result.get("is_complete"):
+            await self.think()
+            answer = f"Answer {result['question_number']} from user {self.index}: {result.get('question', '')[::-1]}"
+            result = await self.next_question({"user_email": self.email, "answer": answer})
+        self.completed_chat = bool(result and result.get("is_complete"))
+
+    async def poll_status(self):
+        for _ in range(self.args.max_polls):
+            response = await self.request(
+                "GET /api/status/user-status", "GET", "/api/status/user-status",
+                params={"email": self.email}, headers=self.cookie
+            )
+            if response is not None and response.status_code == 200 and response.json().get("has_embedding"):
+                self.embedded = True
+                return
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def check_result(self):
+        await self.request("GET /api/round1/check-result", "GET", "/api/round1/check-result",
+                           params={"email": self.email})
+
+    async def run(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.register()
+        await self.think()
+        await self.chat()
+        if self.completed_chat:
+            await self.poll_status()
+        await self.check_result()
+
+
+def build_report(recorder: Recorder, users: List[VirtualUser], openai) -> Dict:
+    elapsed = recorder.finished - recorder.started
+    routes = {}
+    for route, latencies in sorted(recorder.latencies.items()):
+        statuses = dict(recorder.statuses[route])
+        errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+            "statuses": statuses
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "users": len(users),
+        "completed_chat": sum(user.completed_chat for user in users),
+        "embedded": sum(user.embedded for user in users),
+        "openai_chat_calls": openai.chat.completions.calls,
+        "openai_embedding_calls": openai.embeddings.calls,
+        "routes": routes
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{report['requests']:,} requests in {report['elapsed_seconds']}s ({report['throughput_rps']} req/s)")
+    print(f"Users: {report['users']}, chats completed: {report['completed_chat']}, embedded: {report['embedded']}")
+    print(f"Fake OpenAI calls: {report['openai_chat_calls']} chat, {report['openai_embedding_calls']} embedding\n")
+    print(f"{'route':<40} {'reqs':>6} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for route, stats in report["routes"].items():
+        print(
+            f"{route:<40} {stats['requests']:>6} {stats['errors']:>6} {stats['throughput_rps']:>7} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['max_ms']:>8}"
+        )
+    for route, stats in report["routes"].items():
+        unexpected = {status: count for status, count in stats["statuses"].items() if not status.startswith("2")}
+        if unexpected:
+            print(f"  {route}: {unexpected}")
+
+
+async def run(args) -> Dict:
+    import httpx
+    from app.main import app, lifespan
+    from app.utils.helper.fake_services import install_fakes
+    from app.utils.embedding_providers import get_embedding_provider
+
+    openai = await install_fakes(
+        chat_latency_ms=args.chat_latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        auth_latency_ms=args.auth_latency_ms,
+        embedding_dimensions=args.embedding_dimensions or get_embedding_provider().dimensions,
+        seed=args.seed
+    )
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=120) as http:
+            rng = random.Random(args.seed)
+            pacer = Pacer(args.rps)
+            recorder = Recorder()
+            users = [VirtualUser(i, http, pacer, recorder, args, random.Random(args.seed + i)) for i in range(args.users)]
+            await asyncio.gather(*(user.run(rng.uniform(0, args.ramp_up)) for user in users))
+            recorder.finished = time.perf_counter()
+    return build_report(recorder, users, openai)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="fyd-load-") as workdir:
+        configure_environment(args, workdir)
+        report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(route["errors"] == 0 for route in report["routes"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Local stand-in for Redis, for development and tests of the Redis rate-limit
+backend without a Redis install. Speaks RESP2 and implements only
+PING, GET, SET, INCR, DECR, EXPIRE, TTL, DEL, SCAN (MATCH/COUNT) and FLUSHDB,
+keeping everything in memory.
+
+Usage:
+    python -m app.utils.helper.local_resp_server [port]
+
+Then run the API with RATE_LIMIT_BACKEND=redis RATE_LIMIT_REDIS_URL=redis://localhost:<port>/0
+"""
+
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from typing import Dict, Optional, Tuple
+from fnmatch import fnmatchcase
+import threading
+import time
+import sys
+
+from app.utils.resp_client import RespReader
+
+
+class Store:
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._cursors: Dict[int, bytes] = {}
+        self._next_cursor = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def execute(self, command: list) -> bytes:
+        name = command[0].decode().upper()
+        args = command[1:]
+        with self._lock:
+            if name == "PING":
+                return b"+PONG\r\n"
+            if name == "GET":
+                value = self._get(args[0])
+                return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+            if name == "SET":
+                self._data[args[0]] = (args[1], None)
+                return b"+OK\r\n"
+            if name in ("INCR", "DECR"):
+                value = self._get(args[0])
+                try:
+                    number = int(value or 0) + (1 if name == "INCR" else -1)
+                except ValueError:
+                    return b"-ERR value is not an integer or out of range\r\n"
+                expires_at = self._data[args[0]][1] if value is not None else None
+                self._data[args[0]] = (str(number).encode(), expires_at)
+                return b":%d\r\n" % number
+            if name == "EXPIRE":
+                value = self._get(args[0])
+                if value is None:
+                    return b":0\r\n"
+                self._data[args[0]] = (value, time.monotonic() + int(args[1]))
+                return b":1\r\n"
+            if name == "TTL":
+                if self._get(args[0]) is None:
+                    return b":-2\r\n"
+                expires_at = self._data[args[0]][1]
+                return b":-1\r\n" if expires_at is None else b":%d\r\n" % int(expires_at - time.monotonic())
+            if name == "DEL":
+                removed = sum(1 for key in args if self._data.pop(key, None) is not None)
+                return b":%d\r\n" % removed
+            if name == "SCAN":
+                return self._scan(int(args[0]), args[1:])
+            if name == "FLUSHDB":
+                self._data.clear()
+                return b"+OK\r\n"
+            if name in ("SELECT", "AUTH"):
+                return b"+OK\r\n"
+        return f"-ERR unknown command '{name}'\r\n".encode()
+
+    def _scan(self, cursor: int, options: list) -> bytes:
+        """Cursors resume after the last key returned, so deleting keys mid-scan skips nothing"""
+        pattern, count = b"*", 10
+        for option, value in zip(options[::2], options[1::2]):
+            if option.upper() == b"MATCH":
+                pattern = value
+            elif option.upper() == b"COUNT":
+                count = int(value)
+        after = self._cursors.pop(cursor, b"") if cursor else b""
+        keys = sorted(key for key in list(self._data) if key > after and self._get(key) is not None)
+        batch = keys[:count]
+        next_cursor = 0
+        if len(keys) > count:
+            self._next_cursor += 1
+            next_cursor = self._next_cursor
+            self._cursors[next_cursor] = batch[-1]
+        matched = [key for key in batch if fnmatchcase(key.decode("utf-8", "replace"), pattern.decode())]
+        cursor_bytes = str(next_cursor).encode()
+        reply = [b"*2\r\n", b"$%d\r\n%s\r\n" % (len(cursor_bytes), cursor_bytes), b"*%d\r\n" % len(matched)]
+        reply += [b"$%d\r\n%s\r\n" % (len(key), key) for key in matched]
+        return b"".join(reply)
+
+
+class RespHandler(StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        reader = RespReader(self.rfile)
+        while True:
+            try:
+                command = reader.read()
+            except (ConnectionError, ValueError):
+                return
+            if not isinstance(command, list) or not command:
+                self.wfile.write(b"-ERR protocol error\r\n")
+                return
+            self.wfile.write(self.server.store.execute(command))
+            self.wfile.flush()
+
+
+class LocalRespServer(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6380):
+        super().__init__((host, port), RespHandler)
+        self.store = Store()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "LocalRespServer":
+        """Serve from a background thread (useful in tests); pass port 0 for a free port"""
+        threading.Thread(target=self.serve_forever, name="local-resp-server", daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6380
+    server = LocalRespServer(port=port)
+    print(f"Local RESP server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,97 @@
+"""
+Token-counting report for prompt compaction.
+Shows, per question, how many conversation-context tokens the prompt would
+carry verbatim versus after compaction, and the totals for the whole
+questionnaire.
+
+Usage:
+    python -m app.utils.helper.prompt_token_report              # sample questionnaire
+    python -m app.utils.helper.prompt_token_report user@snu.edu.in
+"""
+
+from dotenv import load_dotenv
+import asyncio
+import sys
+
+load_dotenv()
+
+from typing import Dict, List
+
+from app.core.prompt_compaction import (
+    compact_context,
+    full_context_tokens,
+    count_tokens,
+    PROMPT_CONTEXT_TOKEN_BUDGET,
+    PROMPT_RECENT_TURNS,
+    PROMPT_INPUT_COST_PER_MILLION
+)
+
+SAMPLE_CHAT = [
+    {"q": "What's one value you'd never compromise on?", "a": "Honesty, definitely. I'd rather hear an uncomfortable truth than be kept in the dark, and I try to be upfront with people too."},
+    {"q": "How do your friends usually describe you?", "a": "Probably the calm one in the group who plans everything. I'm the person who remembers birthdays and books the table."},
+    {"q": "What does a good relationship look like to you?", "a": "Two people who are each other's biggest fans but still have their own lives, hobbies and friends. Lots of laughing."},
+    {"q": "How do you handle disagreements?", "a": "I need a bit of time to cool off, then I like talking it through properly instead of pretending it didn't happen."},
+    {"q": "What are you working towards right now?", "a": "Finishing my computer science degree and getting an internship at a startup, ideally something in climate tech."},
+    {"q": "What's your ideal Saturday?", "a": "Slow breakfast, a long walk or a hike if the weather is good, then board games with a few close friends in the evening."},
+    {"q": "Big parties or small hangouts?", "a": "Small hangouts for sure. Big parties are fun once in a while but I'm drained after a couple of hours."},
+    {"q": "What hobby could you talk about for hours?", "a": "Photography. I shoot mostly film, street photography and portraits of friends, and I develop the rolls myself."},
+    {"q": "How do you recharge after a busy week?", "a": "Music, cooking something new and an early night. Sunday is usually a no-plans day for me."},
+    {"q": "What music would we hear on your playlist?", "a": "Indie rock, some old Bollywood and a lot of lo-fi when I'm studying."}
+]
+
+
+def token_report(chat_history: List[Dict[str, str]]) -> Dict:
+    """Per-turn context tokens with and without compaction for one questionnaire"""
+    turns = []
+    # Question N is generated from the first N-1 answers
+    for count in range(len(chat_history)):
+        history = chat_history[:count]
+        full = full_context_tokens(history)
+        sent = count_tokens(compact_context(history))
+        turns.append({"question_number": count + 1, "full_tokens": full, "sent_tokens": sent})
+
+    full_total = sum(turn["full_tokens"] for turn in turns)
+    sent_total = sum(turn["sent_tokens"] for turn in turns)
+    return {
+        "turns": turns,
+        "full_tokens": full_total,
+        "sent_tokens": sent_total,
+        "tokens_saved": full_total - sent_total,
+        "cost_saved_usd": (full_total - sent_total) * PROMPT_INPUT_COST_PER_MILLION / 1_000_000
+    }
+
+
+async def load_chat(user_email: str):
+    from app.core.questionnaire_sessions import questionnaire_sessions
+    session = await questionnaire_sessions.get(user_email)
+    return session.chat_history
+
+
+def main():
+    chat_history = SAMPLE_CHAT
+    if len(sys.argv) > 1:
+        chat_history = asyncio.run(load_chat(sys.argv[1]))
+        if not chat_history:
+            print(f"No questionnaire session found for {sys.argv[1]}")
+            return
+
+    report = token_report(chat_history)
+
+    print(f"Budget: {PROMPT_CONTEXT_TOKEN_BUDGET} tokens, recent turns kept verbatim: {PROMPT_RECENT_TURNS}\n")
+    print(f"{'Question':>8}  {'Full':>6}  {'Sent':>6}  {'Saved':>6}")
+    for turn in report["turns"]:
+        saved = turn["full_tokens"] - turn["sent_tokens"]
+        print(f"{turn['question_number']:>8}  {turn['full_tokens']:>6}  {turn['sent_tokens']:>6}  {saved:>6}")
+
+    print(f"\nTotal context tokens: {report['full_tokens']} -> {report['sent_tokens']}")
+    if report["full_tokens"]:
+        print(f"Saved: {report['tokens_saved']} ({report['tokens_saved'] / report['full_tokens']:.0%}), "
+              f"${report['cost_saved_usd']:.6f} per questionnaire")
+    print("Latency impact is visible in the llm_attempt_seconds histogram.")
+
+    print("\nContext sent for the last question:\n")
+    print(compact_context(chat_history[:-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Re-embed every stored questionnaire with the configured embedding provider.
+Completed transcripts are read from the questionnaire_sessions table in id
+order and embedded in batches, several requests at a time, under a
+requests/tokens-per-minute budget. Vectors go to a new Qdrant collection,
+one batched upsert per embedding batch. The last id written contiguously is
+saved to a checkpoint file, so an interrupted run resumes where it stopped.
+
+A reconcile pass then compares every transcript's chat hash with the new
+collection and re-embeds whatever changed during the run. Finally the alias
+the API reads (QDRANT_COLLECTION should name an alias, not a collection) is
+moved to the new collection in a single atomic alias update.
+
+Users who have a vector in the source collection but no stored transcript
+can't be re-embedded; the swap is refused while there are any, unless
+--allow-missing is given.
+
+Usage:
+    EMBEDDING_PROVIDER=openai EMBEDDING_DIMENSIONS=1024 \\
+        python -m app.utils.helper.reembed_backfill --alias find_my_date_live [--source find_my_date]
+        [--batch-size 64] [--concurrency 4] [--rpm 500] [--tpm 1000000] [--no-swap]
+"""
+
+from collections import deque
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from qdrant_client.models import (
+    VectorParams,
+    Distance,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation
+)
+import argparse
+import asyncio
+import json
+import time
+import sys
+import os
+import re
+
+from app.db.database import async_session, has_database
+from app.db.qdrant_client import get_async_qdrant, embedding_point, email_to_uuid, QDRANT_COLLECTION
+from app.models.questionnaire_session import QuestionnaireSession
+from app.core.llm_questionnaire import chat_hash, split_answers, combine_vectors
+from app.core.clients import clients
+from app.utils.embedding_providers import get_embedding_provider
+
+CHARS_PER_TOKEN = 4  # Rough estimate for the tokens-per-minute budget
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-embed all stored questionnaires into a new Qdrant collection")
+    parser.add_argument("--alias", default=QDRANT_COLLECTION, help="Alias the API reads, moved at the end")
+    parser.add_argument("--source", help="Collection to check for users without a transcript (default: the alias)")
+    parser.add_argument("--target", help="New collection (default: derived from the alias and model version)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Users per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--rpm", type=float, default=500, help="Embedding requests per minute")
+    parser.add_argument("--tpm", type=float, default=1_000_000, help="Embedding tokens per minute")
+    parser.add_argument("--page-size", type=int, default=1000, help="Transcripts read per database query")
+    parser.add_argument("--checkpoint", help="Progress file (default: reembed_<target>.checkpoint.json)")
+    parser.add_argument("--allow-missing", action="store_true", help="Swap even if some users have no transcript")
+    parser.add_argument("--no-swap", action="store_true", help="Build the new collection but leave the alias alone")
+    return parser.parse_args(argv)
+
+
+def default_target(alias: str, model_version: str) -> str:
+    return f"{alias}__{re.sub(r'[^A-Za-z0-9]+', '_', model_version).strip('_')}"
+
+
+class RateBudget:
+    """Token buckets for requests and tokens per minute; acquire() waits until both allow the call"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.rates = (requests_per_minute / 60, tokens_per_minute / 60)
+        self.capacity = (requests_per_minute, tokens_per_minute)
+        # Start with a second's worth so the first calls go out immediately, not a minute's burst
+        self.available = [self.rates[0], self.rates[1]]
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        for i in range(2):
+            self.available[i] = min(self.capacity[i], self.available[i] + elapsed * self.rates[i])
+
+    async def acquire(self, tokens: int):
+        # A batch bigger than the whole budget may go once the bucket is full
+        tokens = min(tokens, self.capacity[1])
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.available[0] >= 1 and self.available[1] >= tokens:
+                    self.available[0] -= 1
+                    self.available[1] -= tokens
+                    return
+                wait = max(
+                    (1 - self.available[0]) / self.rates[0],
+                    (tokens - self.available[1]) / self.rates[1]
+                )
+                await asyncio.sleep(wait)
+
+
+class Checkpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def save(self, **values):
+        self.state.update(values)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)  # Atomic, so a crash never leaves a half-written file
+
+
+def transcript_texts(session: QuestionnaireSession) -> Optional[Tuple[str, str, str]]:
+    """(personality text, social text, chat hash) for a stored session, None if it has no answers"""
+    personality_answers, social_answers = split_answers(session.chat_history)
+    if not personality_answers and not social_answers:
+        return None
+    return (
+        " ".join(personality_answers),
+        " ".join(social_answers),
+        chat_hash(personality_answers + social_answers)
+    )
+
+
+async def read_transcripts(after_id: int, limit: int) -> List[QuestionnaireSession]:
+    async with async_session() as db:
+        result = await db.execute(
+            select(QuestionnaireSession)
+            .where(QuestionnaireSession.completed == True, QuestionnaireSession.id > after_id)
+            .order_by(QuestionnaireSession.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+
+class Backfill:
+    def __init__(self, args, target: str, budget: RateBudget, checkpoint: Checkpoint):
+        self.args = args
+        self.target = target
+        self.budget = budget
+        self.checkpoint = checkpoint
+        self.provider = get_embedding_provider()
+        self.qdrant = get_async_qdrant()
+        self.embedded = 0
+        self.skipped = 0
+        self.failed = 0
+
+    async def embed_batch(self, sessions: List[QuestionnaireSession]):
+        """Embed a batch of transcripts in one provider call and upsert them in one Qdrant request"""
+        items = [(session, transcript_texts(session)) for session in sessions]
+        items = [(session, texts) for session, texts in items if texts]
+        self.skipped += len(sessions) - len(items)
+        if not items:
+            return
+
+        # Each user's two sub-texts go out side by side in the same request
+        texts = [text for _, (personality, social, _) in items for text in (personality, social)]
+        inputs = [text for text in texts if text]
+        await self.budget.acquire(sum(map(len, inputs)) // CHARS_PER_TOKEN + 1)
+        results = iter(await self.provider.embed(inputs))
+        vectors = [next(results) if text else [] for text in texts]
+
+        points = []
+        for index, (session, (_, _, current_hash)) in enumerate(items):
+            vector = combine_vectors(vectors[2 * index], vectors[2 * index + 1])
+            if vector is not None:
+                points.append(embedding_point(vector, session.user_email, current_hash, self.provider.model_version))
+        await self.qdrant.upsert(collection_name=self.target, points=points, wait=True)
+        self.embedded += len(points)
+
+    async def run_pass(self, batches):
+        """Embed batches with bounded concurrency; calls on_done(batch) in batch order as they complete"""
+        in_flight = deque()
+        pending = set()
+
+        async def finish_oldest():
+            batch, task = in_flight.popleft()
+            try:
+                await task
+            except Exception as e:
+                self.failed += len(batch)
+                raise RuntimeError(f"Batch ending at session {batch[-1].id} failed: {e}") from e
+            return batch
+
+        try:
+            async for batch in batches:
+                while len(pending) >= self.args.concurrency:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    pending.difference_update(done)
+                task = asyncio.create_task(self.embed_batch(batch))
+                pending.add(task)
+                in_flight.append((batch, task))
+                while in_flight and in_flight[0][1].done():
+                    yield await finish_oldest()
+            while in_flight:
+                yield await finish_oldest()
+        finally:
+            # On failure, don't leave later batches writing behind the checkpoint's back
+            for _, task in in_flight:
+                task.cancel()
+
+    async def batches_from(self, after_id: int):
+        while True:
+            page = await read_transcripts(after_id, self.args.page_size)
+            if not page:
+                return
+            for start in range(0, len(page), self.args.batch_size):
+                yield page[start:start + self.args.batch_size]
+            after_id = page[-1].id
+
+    async def main_pass(self):
+        last_id = self.checkpoint.state.get("last_id", 0)
+        if last_id:
+            print(f"Resuming after session id {last_id}")
+        started = time.perf_counter()
+        async for batch in self.run_pass(self.batches_from(last_id)):
+            self.checkpoint.save(last_id=batch[-1].id)
+            rate = self.embedded / max(time.perf_counter() - started, 1e-9)
+            print(f"  up to session {batch[-1].id}: {self.embedded:,} embedded ({rate:,.0f}/s)", flush=True)
+        self.checkpoint.save(main_pass_done=True)
+
+    async def stale_sessions(self):
+        """Completed transcripts whose vector in the target is missing or from other answers"""
+        after_id = 0
+        while True:
+            page = await read_transcripts(after_id, self.args.page_size)
+            if not page:
+                return
+            after_id = page[-1].id
+            expected = {}
+            for session in page:
+                texts = transcript_texts(session)
+                if texts:
+                    expected[session.user_email] = texts[2]
+            points = await self.qdrant.retrieve(
+                collection_name=self.target,
+                ids=[email_to_uuid(email) for email in expected],
+                with_payload=["email", "chat_hash"],
+                with_vectors=False
+            )
+            stored = {point.payload.get("email"): point.payload.get("chat_hash") for point in points}
+            stale = [session for session in page if session.user_email in expected
+                     and stored.get(session.user_email) != expected[session.user_email]]
+            for start in range(0, len(stale), self.args.batch_size):
+                yield stale[start:start + self.args.batch_size]
+
+    async def reconcile(self, max_rounds: int = 3):
+        """Re-embed transcripts that changed after the main pass read them"""
+        for round_number in range(1, max_rounds + 1):
+            before = self.embedded
+            async for _ in self.run_pass(self.stale_sessions()):
+                pass
+            changed = self.embedded - before
+            print(f"Reconcile round {round_number}: {changed} re-embedded")
+            if not changed:
+                return
+
+
+async def collection_for_alias(client, alias: str) -> Optional[str]:
+    response = await client.get_aliases()
+    for description in response.aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+async def collection_exists(client, name: str) -> bool:
+    response = await client.get_collections()
+    return any(collection.name == name for collection in response.collections)
+
+
+async def ensure_target(client, target: str, source: Optional[str], dimensions: int):
+    if await collection_exists(client, target):
+        return
+    distance = Distance.COSINE
+    if source and await collection_exists(client, source):
+        # Keep the metric of the collection being replaced
+        info = await client.get_collection(source)
+        vectors = info.config.params.vectors
+        distance = getattr(vectors, "distance", distance)
+    await client.create_collection(
+        collection_name=target,
+        vectors_config=VectorParams(size=dimensions, distance=distance)
+    )
+    print(f"Created collection {target} ({dimensions} dimensions, {distance})")
+
+
+async def users_without_transcript(client, source: str, target: str) -> List[str]:
+    """Emails with a vector in the source collection but none in the new one"""
+    missing = []
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=source, limit=1000, offset=offset, with_payload=["email"], with_vectors=False
+        )
+        if points:
+            found = await client.retrieve(
+                collection_name=target, ids=[point.id for point in points], with_payload=False, with_vectors=False
+            )
+            found_ids = {str(point.id) for point in found}
+            missing.extend(
+                point.payload.get("email", str(point.id)) for point in points if str(point.id) not in found_ids
+            )
+        if offset is None:
+            return missing
+
+
+async def swap_alias(client, alias: str, target: str):
+    """Point the alias at the target; deleting and recreating it in one request makes the switch atomic"""
+    operations = []
+    if await collection_for_alias(client, alias):
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=alias)))
+    await client.update_collection_aliases(change_aliases_operations=operations)
+
+
+async def run(args) -> int:
+    if not has_database():
+        print("SUPABASE_DB_URL is not set; transcripts are read from the questionnaire_sessions table")
+        return 1
+
+    provider = get_embedding_provider()
+    client = get_async_qdrant()
+    target = args.target or default_target(args.alias, provider.model_version)
+    checkpoint = Checkpoint(args.checkpoint or f"reembed_{target}.checkpoint.json")
+    if checkpoint.state.get("model_version", provider.model_version) != provider.model_version:
+        print(f"Checkpoint {checkpoint.path} was written for {checkpoint.state['model_version']}; "
+              f"remove it to start over with {provider.model_version}")
+        return 1
+    checkpoint.save(target=target, model_version=provider.model_version)
+
+    current = await collection_for_alias(client, args.alias)
+    if current is None and await collection_exists(client, args.alias):
+        print(f"{args.alias} is a collection, not an alias, so it can't be switched atomically. "
+              f"Rerun with --alias <new alias name> --source {args.alias}, then point QDRANT_COLLECTION at that alias.")
+        return 1
+    source = args.source or current
+    if source == target:
+        print(f"The alias already points at {target}; pass --target to build a different collection")
+        return 1
+
+    print(f"Re-embedding into {target} with {provider.model_version} "
+          f"({args.batch_size} users per request, {args.concurrency} in flight)")
+    await ensure_target(client, target, source, provider.dimensions)
+
+    backfill = Backfill(args, target, RateBudget(args.rpm, args.tpm), checkpoint)
+    started = time.perf_counter()
+    if not checkpoint.state.get("main_pass_done"):
+        await backfill.main_pass()
+    await backfill.reconcile()
+    print(f"Embedded {backfill.embedded:,} users in {time.perf_counter() - started:.1f}s "
+          f"({backfill.skipped} transcripts without answers skipped)")
+
+    if source and await collection_exists(client, source):
+        missing = await users_without_transcript(client, source, target)
+        if missing:
+            print(f"{len(missing)} users in {source} have no stored transcript, e.g. {', '.join(missing[:5])}")
+            if not args.allow_missing and not args.no_swap:
+                print("Not swapping; rerun with --allow-missing to drop them from the new collection")
+                return 1
+
+    if args.no_swap:
+        print(f"Left {args.alias} unchanged; {target} is ready")
+        return 0
+    await swap_alias(client, args.alias, target)
+    checkpoint.save(swapped=True)
+    print(f"✅ {args.alias} now points at {target}" + (f" (was {current})" if current else ""))
+    return 0
+
+
+async def main_async(args) -> int:
+    try:
+        return await run(args)
+    finally:
+        await clients.aclose()
+
+
+def main(argv=None):
+    return asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
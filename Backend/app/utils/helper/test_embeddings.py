@@ -7,14 +7,16 @@ This will:
 4. Show which sentences are most similar
 
 This helps verify that the embedding system is working correctly.
+Sentences are embedded with the configured provider (EMBEDDING_PROVIDER), so
+compare against vectors stored with the same model version.
 """
 
 import os
 import uuid
+import asyncio
 import numpy as np
 from qdrant_client import QdrantClient
 from dotenv import load_dotenv
-from openai import OpenAI
 
 load_dotenv()
 
@@ -22,26 +24,21 @@ load_dotenv()
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "find_my_date")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Initialize clients
 qdrant = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+
+# Imported after load_dotenv() so the provider settings from .env apply
+from app.utils.embedding_providers import get_embedding_provider
 
 def email_to_uuid(email: str) -> str:
     """Convert email to UUID"""
     namespace = uuid.UUID('6ba7b810-9dad-11d1-80b4-00c04fd430c8')
     return str(uuid.uuid5(namespace, email))
 
-def get_text_embedding(text: str):
-    """Convert text to embedding using OpenAI"""
-    if not text:
-        return []
-    res = openai_client.embeddings.create(
-        model="text-embedding-3-large",
-        input=text
-    )
-    return res.data[0].embedding
+def get_text_embeddings(texts: list):
+    """Convert texts to embeddings with the configured provider, in one batch"""
+    return asyncio.run(get_embedding_provider().embed(texts))
 
 def cosine_similarity(vec1, vec2):
     """Calculate cosine similarity between two vectors"""
@@ -79,12 +76,21 @@ def test_embeddings(email: str, test_sentences: list):
             return
         
         stored_vector = result[0].vector
-        print(f"✅ Retrieved stored vector ({len(stored_vector)} dimensions)\n")
+        print(f"✅ Retrieved stored vector ({len(stored_vector)} dimensions)")
+        stored_version = (result[0].payload or {}).get("model_version", "unknown")
+        print(f"   Stored with {stored_version}, testing with {get_embedding_provider().model_version}\n")
         
     except Exception as e:
         print(f"❌ Error retrieving vector: {e}")
         return
     
+    try:
+        test_embeddings_list = get_text_embeddings(test_sentences)
+
+    except Exception as e:
+        print(f"❌ Error creating embeddings: {e}")
+        return
+    
     # Test each sentence
     print("=" * 80)
     print("TESTING SENTENCES")
@@ -97,7 +103,7 @@ def test_embeddings(email: str, test_sentences: list):
         print(f"   Sentence: \"{sentence}\"")
         
         # Create embedding for test sentence
-        test_embedding = get_text_embedding(sentence)
+        test_embedding = test_embeddings_list[i - 1]
         
         if not test_embedding:
             print(f"   ❌ Failed to create embedding")
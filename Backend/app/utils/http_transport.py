@@ -0,0 +1,162 @@
+"""
+Shared, pooled HTTP transports for outbound calls (OpenAI, Supabase, Qdrant).
+Every client in the process sends its requests through the same connection
+pool, so keep-alive connections and TLS sessions are reused across modules.
+HTTP/2 is negotiated with services that offer it. Requests and open
+connections are counted per host in the metrics registry.
+"""
+
+from typing import Dict, Tuple
+from app.core.clients import clients
+from app.core.metrics import registry
+import httpx
+import time
+import os
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "true").lower() == "true"
+
+http_client_requests = registry.counter(
+    "http_client_requests_total",
+    "Outbound HTTP requests by host and status code (status 'error' for transport failures)",
+    ("host", "status")
+)
+http_client_request_seconds = registry.histogram(
+    "http_client_request_seconds",
+    "Outbound HTTP time to response headers",
+    ("host",)
+)
+http_client_in_flight = registry.gauge(
+    "http_client_in_flight",
+    "Outbound HTTP requests waiting for response headers",
+    ("host",)
+)
+http_client_connections = registry.gauge(
+    "http_client_connections",
+    "Pooled outbound connections by host, state (active/idle) and protocol",
+    ("host", "state", "http_version")
+)
+
+
+def limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def client_timeout(read: float) -> httpx.Timeout:
+    """Timeout for a client on the shared transport; `read` is the service's request timeout"""
+    return httpx.Timeout(read, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT)
+
+
+def _pool_connections(transport) -> Dict[Tuple[str, str, str], float]:
+    counts = {}
+    pool = getattr(transport, "_pool", None)
+    for connection in list(getattr(pool, "connections", [])):
+        try:
+            info = connection.info()
+            host = info.split("://", 1)[-1].split(":", 1)[0].split("'", 1)[0]
+            state = "idle" if connection.is_idle() else "active"
+            version = "HTTP/2" if "HTTP/2" in info else "HTTP/1.1"
+        except Exception:
+            continue
+        key = (host, state, version)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+class _RequestTimer:
+    def __init__(self, request: httpx.Request):
+        self.host = request.url.host
+        self.started = time.perf_counter()
+        http_client_in_flight.inc(host=self.host)
+
+    def finish(self, status):
+        http_client_in_flight.dec(host=self.host)
+        http_client_request_seconds.observe(time.perf_counter() - self.started, host=self.host)
+        http_client_requests.inc(host=self.host, status=str(status))
+
+
+class SharedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Pooled async transport shared by several AsyncClients. Closing a client
+    doesn't close the pool; the client registry does that on shutdown.
+    """
+
+    def __init__(self):
+        self.transport = httpx.AsyncHTTPTransport(http2=HTTP_HTTP2, limits=limits())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timer = _RequestTimer(request)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            timer.finish("error")
+            raise
+        timer.finish(response.status_code)
+        return response
+
+    def __deepcopy__(self, memo):
+        # qdrant-client deep-copies its constructor kwargs; the pool must stay shared
+        return self
+
+    async def aclose(self):
+        pass
+
+    async def close_pool(self):
+        await self.transport.aclose()
+
+
+class SharedTransport(httpx.BaseTransport):
+    """Sync counterpart of SharedAsyncTransport, for the Supabase and sync Qdrant clients"""
+
+    def __init__(self):
+        self.transport = httpx.HTTPTransport(http2=HTTP_HTTP2, limits=limits())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        timer = _RequestTimer(request)
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            timer.finish("error")
+            raise
+        timer.finish(response.status_code)
+        return response
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        self.transport.close()
+
+
+def get_async_transport() -> SharedAsyncTransport:
+    return clients.get("http_transport")
+
+
+def get_sync_transport() -> SharedTransport:
+    return clients.get("http_transport_sync")
+
+
+def _connection_counts():
+    counts = {}
+    for name in ("http_transport", "http_transport_sync"):
+        if name in clients.initialized():
+            for key, value in _pool_connections(clients.get(name).transport).items():
+                counts[key] = counts.get(key, 0) + value
+    return counts
+
+
+http_client_connections.set_function(_connection_counts)
+
+clients.register("http_transport", SharedAsyncTransport, close=lambda transport: transport.close_pool())
+clients.register("http_transport_sync", SharedTransport, close=lambda transport: transport.close_pool())
@@ -0,0 +1,81 @@
+"""
+Shared async OpenAI client for the questionnaire and embedding paths.
+The client is created on first use through the shared client registry.
+Requests share the process-wide pooled HTTP transport.
+Chat calls go through `openai_slot()` so a single worker never has more than
+OPENAI_MAX_CONCURRENCY requests in flight against the API, and so repeated
+failures open the OpenAI circuit breaker (see app.core.resilience).
+Embedding calls go through `openai_embedding_slot()`, a separate guard with
+its own concurrency limit and slow-call threshold: large batches are allowed
+to take much longer than a chat turn, and a slow backfill must not open the
+breaker that sends every chat turn to the fallback questions.
+"""
+
+from openai import AsyncOpenAI
+from app.core.clients import clients
+from app.core.resilience import DependencyGuard
+from app.utils.http_transport import get_async_transport, client_timeout
+from typing import Optional
+import httpx
+import os
+
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Per-call timeouts in seconds
+OPENAI_CHAT_TIMEOUT = float(os.getenv("OPENAI_CHAT_TIMEOUT", "15"))
+OPENAI_EMBEDDING_TIMEOUT = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT", "20"))
+# Client-level default for calls that don't pass their own timeout
+OPENAI_REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", "60"))
+# Calls (or streams) taking longer than this count as failures for the circuit breaker
+OPENAI_SLOW_CALL_SECONDS = float(os.getenv("OPENAI_SLOW_CALL_SECONDS", "6"))
+OPENAI_EMBEDDING_MAX_CONCURRENCY = int(os.getenv("OPENAI_EMBEDDING_MAX_CONCURRENCY", "16"))
+OPENAI_EMBEDDING_SLOW_CALL_SECONDS = float(os.getenv("OPENAI_EMBEDDING_SLOW_CALL_SECONDS", "15"))
+
+
+def get_openai() -> AsyncOpenAI:
+    return clients.get("openai")
+
+
+clients.register(
+    "openai",
+    lambda: AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=httpx.AsyncClient(
+            transport=get_async_transport(),
+            timeout=client_timeout(OPENAI_REQUEST_TIMEOUT),
+            follow_redirects=True
+        )
+    ),
+    close=lambda client: client.close()
+)
+
+
+def __getattr__(name):
+    # `client` is created on first use so importing the app doesn't need OPENAI_API_KEY
+    if name == "client":
+        return get_openai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Global OpenAI guard instances; their bulkheads are the concurrency limits
+openai_guard = DependencyGuard(
+    "openai", OPENAI_MAX_CONCURRENCY, OPENAI_SLOW_CALL_SECONDS, bulkhead_wait=None
+)
+openai_embedding_guard = DependencyGuard(
+    "openai_embeddings", OPENAI_EMBEDDING_MAX_CONCURRENCY, OPENAI_EMBEDDING_SLOW_CALL_SECONDS, bulkhead_wait=None
+)
+
+
+def openai_slot(timeout: Optional[float] = None):
+    """
+    Wait (at most `timeout` seconds) for a free slot under the global OpenAI concurrency limit.
+    Raises DependencyUnavailable straight away while the OpenAI breaker is open.
+    """
+    return openai_guard.guard(wait=timeout)
+
+
+def openai_embedding_slot(timeout: Optional[float] = None):
+    """openai_slot() for embedding requests, under the separate embeddings guard"""
+    return openai_embedding_guard.guard(wait=timeout)
@@ -0,0 +1,125 @@
+"""
+Minimal blocking client for the Redis protocol (RESP2).
+Only what the rate limiter needs: send a pipeline of commands over one
+connection per thread and read the replies. Works against Redis, Valkey,
+KeyDB or the local stand-in in app/utils/helper/local_resp_server.py.
+"""
+
+from typing import List, Optional, Union
+from urllib.parse import urlparse
+import threading
+import socket
+
+
+class RespError(Exception):
+    """Error reply from the server"""
+
+
+Reply = Union[None, int, bytes, str, list, RespError]
+
+
+def encode_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RespReader:
+    """Parses replies from a buffered socket file"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _line(self) -> bytes:
+        line = self.stream.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        return line[:-2]
+
+    def read(self) -> Reply:
+        line = self._line()
+        kind, rest = line[:1], line[1:]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.stream.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by server")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self.read() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply type: {line[:20]!r}")
+
+
+class RespClient:
+    """Redis-protocol client keeping one connection per thread"""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout: float = 0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, RespReader(sock.makefile("rb")))
+        self._local.conn = conn
+
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            for reply in self._send(setup):
+                if isinstance(reply, RespError):
+                    self.close()
+                    raise reply
+        return conn
+
+    def _send(self, commands) -> List[Reply]:
+        sock, reader = self._local.conn
+        sock.sendall(b"".join(encode_command(*command) for command in commands))
+        return [reader.read() for _ in commands]
+
+    def pipeline(self, *commands) -> List[Reply]:
+        """Send several commands in one round trip. Error replies are returned, not raised"""
+        if getattr(self._local, "conn", None) is None:
+            self._connect()
+        try:
+            return self._send(commands)
+        except (OSError, ConnectionError):
+            # Drop the broken connection so the next call reconnects
+            self.close()
+            raise
+
+    def execute(self, *args) -> Reply:
+        reply = self.pipeline(args)[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def close(self):
+        conn: Optional[tuple] = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
@@ -0,0 +1,43 @@
+"""
+Shared Supabase client, created on first use through the client registry.
+Its requests go through the process-wide pooled HTTP transport. The client is
+blocking, so request handlers call it through `supabase_guard.run_sync`, which
+runs it in a thread under the Supabase bulkhead and circuit breaker.
+"""
+
+from supabase import create_client, Client, ClientOptions
+from dotenv import load_dotenv
+from app.core.clients import clients
+from app.utils.http_transport import get_sync_transport, client_timeout
+from app.core.resilience import DependencyGuard
+import httpx
+import os
+
+load_dotenv()
+
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_BULKHEAD_SIZE = int(os.getenv("SUPABASE_BULKHEAD_SIZE", "16"))
+SUPABASE_SLOW_CALL_SECONDS = float(os.getenv("SUPABASE_SLOW_CALL_SECONDS", "3"))
+
+
+def create_supabase() -> Client:
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+    http_client = httpx.Client(
+        transport=get_sync_transport(),
+        timeout=client_timeout(SUPABASE_TIMEOUT),
+        follow_redirects=True
+    )
+    return create_client(url, key, options=ClientOptions(httpx_client=http_client))
+
+
+def get_supabase() -> Client:
+    return clients.get("supabase")
+
+
+clients.register("supabase", create_supabase)
+
+# Global Supabase guard instance
+supabase_guard = DependencyGuard("supabase", SUPABASE_BULKHEAD_SIZE, SUPABASE_SLOW_CALL_SECONDS)